@@ -1,11 +1,22 @@
 import streamlit as st
 import os
-from PIL import Image
-import io
-from pathlib import Path
 import base64
-import re
+import uuid
 from datetime import datetime
+from pathlib import Path
+
+from batch import DEFAULT_RETRIES, STATUS_DONE, STATUS_FAILED, plan_batch
+
+from conversion import (DEFAULT_COMPRESSION, DEFAULT_MAX_DIMENSION, DEFAULT_QUALITY, DEFAULT_WORKERS,
+                        sort_images)
+from folder_index import FolderIndex
+from jobs import STATUS_CANCELLED, STATUS_PENDING, JobManager
+from ocr import DEFAULT_OCR_LANG, ocr_available
+from page_cache import PageCache
+from probe import calibrate, estimate_conversion, probe_known
+from selection import Selection, page_bounds, page_count
+from thumbnails import ThumbnailCache
+from uploads import UploadSpool
 
 # -------------------------------------------------
 # CONFIG
@@ -20,8 +31,15 @@ st.set_page_config(
 # -------------------------------------------------
 # CONSTANTS
 # -------------------------------------------------
-ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp', '.webp', '.gif'}
-MAX_PREVIEW_IMAGES = 20
+# Grilles de miniatures : colonnes et nombres d'images par page proposés
+GRID_COLUMNS = 4
+GRID_PAGE_SIZES = [24, 48, 96]
+# Au-delà, le PDF n'est pas proposé en téléchargement : il doit être
+# enregistré dans un dossier (le fichier servi est chargé en mémoire)
+MAX_DOWNLOAD_BYTES = 500 * 1024 * 1024
+# Suivi d'une conversion en arrière-plan (s)
+JOB_POLL_INTERVAL = 1.0
+COMPRESSION_LABELS = {"auto": "Automatique", "jpeg": "JPEG"}
 
 
 # -------------------------------------------------
@@ -269,67 +287,6 @@ def display_logo():
                 unsafe_allow_html=True)
 
 
-# -------------------------------------------------
-# SORTING FUNCTIONS
-# -------------------------------------------------
-def natural_sort_key(s):
-    """Clé de tri naturel pour les noms de fichiers"""
-    return [int(text) if text.isdigit() else text.lower()
-            for text in re.split(r'(\d+)', s)]
-
-
-def sort_images(image_list, sort_by="nom"):
-    """Trie les images selon différents critères"""
-    if not image_list:
-        return []
-
-    if sort_by == "nom":
-        # Tri naturel (1, 2, 10 au lieu de 1, 10, 2)
-        return sorted(image_list, key=natural_sort_key)
-
-    elif sort_by == "date_creation":
-        # Trier par date de création (du plus ancien au plus récent)
-        images_with_dates = []
-        for img in image_list:
-            try:
-                if "uploaded_file" in st.session_state:
-                    # Pour les fichiers uploadés
-                    file_path = img.name
-                else:
-                    # Pour les fichiers locaux
-                    file_path = os.path.join(st.session_state.get("folder", ""), img)
-
-                if os.path.exists(file_path):
-                    creation_time = os.path.getctime(file_path)
-                    images_with_dates.append((img, creation_time))
-            except:
-                images_with_dates.append((img, 0))
-
-        return [img for img, _ in sorted(images_with_dates, key=lambda x: x[1])]
-
-    elif sort_by == "taille":
-        # Trier par taille (croissante)
-        images_with_sizes = []
-        for img in image_list:
-            try:
-                if "uploaded_file" in st.session_state:
-                    size = len(img.getvalue())
-                else:
-                    file_path = os.path.join(st.session_state.get("folder", ""), img)
-                    size = os.path.getsize(file_path)
-                images_with_sizes.append((img, size))
-            except:
-                images_with_sizes.append((img, 0))
-
-        return [img for img, _ in sorted(images_with_sizes, key=lambda x: x[1])]
-
-    elif sort_by == "type":
-        # Trier par type d'extension
-        return sorted(image_list, key=lambda x: Path(x).suffix.lower())
-
-    return sorted(image_list)
-
-
 # -------------------------------------------------
 # SESSION STATE INITIALIZATION
 # -------------------------------------------------
@@ -338,11 +295,17 @@ def init_session_state():
     defaults = {
         "folder": None,
         "uploaded_files": [],
+        "spooled_uploads": {},
         "selected_images": [],
+        "selection": None,
+        "selection_folder": None,
+        "batch_job_ids": [],
+        "batch_output_dir": "",
         "sort_method": "nom",
         "current_tab": "dossier",
         "processing": False,
-        "preview_images": []
+        "job_id": None,
+        "session_id": uuid.uuid4().hex,
     }
 
     for key, value in defaults.items():
@@ -352,6 +315,177 @@ def init_session_state():
 
 init_session_state()
 
+
+# -------------------------------------------------
+# THUMBNAIL CACHE
+# -------------------------------------------------
+@st.cache_resource
+def get_thumbnail_cache():
+    """Cache de miniatures partagé par toutes les sessions"""
+    return ThumbnailCache()
+
+
+thumbnail_cache = get_thumbnail_cache()
+
+
+@st.cache_resource
+def get_page_cache():
+    """Cache disque des pages préparées, partagé par toutes les sessions"""
+    return PageCache()
+
+
+@st.cache_resource
+def get_upload_spool():
+    """Copies sur disque des fichiers uploadés, partagées par toutes les sessions"""
+    return UploadSpool()
+
+
+def spool_uploads(uploaded_files):
+    """Copie sur disque les fichiers uploadés, une seule fois par fichier.
+
+    Les copies déjà faites lors d'un rerun précédent sont réutilisées ; les
+    copies expirées des sessions abandonnées sont purgées au passage.
+    """
+    spool = get_upload_spool()
+    spool.purge_if_due()
+    spooled = st.session_state.spooled_uploads
+    current = {}
+    for uploaded in uploaded_files:
+        key = getattr(uploaded, "file_id", None) or (uploaded.name, uploaded.size)
+        upload = spooled.get(key)
+        if upload is None or not os.path.exists(upload.path):
+            upload = spool.ingest(uploaded)
+        current[key] = upload
+    st.session_state.spooled_uploads = current
+    return list(current.values())
+
+
+@st.cache_resource(max_entries=32)
+def get_folder_index(folder):
+    """Index du dossier, conservé entre les reruns et rafraîchi à la demande"""
+    return FolderIndex(folder)
+
+
+@st.cache_resource
+def get_job_manager():
+    """Ordonnanceur des conversions, partagé par toutes les sessions du serveur"""
+    return JobManager()
+
+
+job_manager = get_job_manager()
+
+
+# -------------------------------------------------
+# THUMBNAIL GRID
+# -------------------------------------------------
+def _toggle_image(selection, name, widget_key):
+    selection.set(name, st.session_state[widget_key])
+
+
+def show_image_grid(names, path_of, key, selection=None):
+    """Grille paginée de miniatures.
+
+    Seules les images de la page affichée ont des widgets ; leurs miniatures
+    sont chargées depuis le cache une fois la grille en place, et celles de
+    la page suivante sont préparées en arrière-plan. Avec ``selection``
+    (:class:`Selection`), chaque miniature a sa case à cocher.
+    """
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        per_page = st.selectbox("Images par page :", GRID_PAGE_SIZES, key=f"{key}_per_page")
+    pages = page_count(len(names), per_page)
+    # Page ramenée dans les limites si la liste ou le nombre par page a changé
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    with col1:
+        page = st.number_input(f"Page (sur {pages}) :", min_value=1, max_value=pages, step=1,
+                               key=f"{key}_page")
+
+    start, end = page_bounds(len(names), page, per_page)
+    visible = names[start:end]
+    cols = st.columns(GRID_COLUMNS)
+    slots = []
+    for idx, name in enumerate(visible):
+        with cols[idx % GRID_COLUMNS]:
+            slots.append(st.empty())
+            if selection is None:
+                st.caption(name)
+            else:
+                widget_key = f"{key}_{selection.generation}_{name}"
+                st.checkbox(name, value=name in selection, key=widget_key,
+                            on_change=_toggle_image, args=(selection, name, widget_key))
+
+    # Miniatures chargées après les cases à cocher : la grille est utilisable
+    # sans attendre le décodage des images absentes du cache
+    for slot, name in zip(slots, visible):
+        try:
+            slot.image(thumbnail_cache.get(path_of(name)), width="stretch")
+        except Exception:
+            slot.text(f"📄 {name}")
+
+    thumbnail_cache.prefetch([path_of(name) for name in names[end:end + per_page]])
+
+
+# -------------------------------------------------
+# BATCH JOBS
+# -------------------------------------------------
+def submit_batch(batch_jobs, **options):
+    """Soumet chaque dossier du lot à l'ordonnanceur du serveur : les dossiers
+    partagent la file, les processus et le budget mémoire des autres conversions"""
+    job_ids = []
+    for batch_job in batch_jobs:
+        names = get_folder_index(batch_job.folder).sorted_names(st.session_state.sort_method)
+        os.makedirs(os.path.dirname(os.path.abspath(batch_job.output)), exist_ok=True)
+        job = job_manager.submit([os.path.join(batch_job.folder, name) for name in names],
+                                 batch_job.output, name=batch_job.name,
+                                 owner=st.session_state.session_id, **options)
+        job_ids.append(job.id)
+    return job_ids
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def show_batch_progress(job_ids, output_dir):
+    """Avancement des dossiers du lot, rafraîchi sans relancer toute la page"""
+    jobs = [job for job in map(job_manager.get, job_ids) if job is not None]
+    if not jobs:
+        return
+    active = [job for job in jobs if job.active]
+    positions = job_manager.queue_positions()
+    st.progress((len(jobs) - len(active)) / len(jobs))
+    st.table([{"Dossier": job.name, "Statut": job.status, "File": str(positions.get(job.id, "")),
+               "Pages": job.page_count, "Ignorées": len(job.skipped)} for job in jobs])
+
+    if active:
+        if st.button("⏹ Annuler le lot", key="cancel_batch", use_container_width=True):
+            for job in active:
+                job_manager.cancel(job.id)
+            st.rerun(scope="fragment")
+        return
+
+    succeeded = sum(job.status == STATUS_DONE for job in jobs)
+    box, icon = ("success", "✅") if succeeded == len(jobs) else ("warning", "⚠️")
+    st.markdown(f"<div class='status-box {box}'>{icon} {succeeded}/{len(jobs)} PDF créés "
+                f"dans {output_dir}</div>", unsafe_allow_html=True)
+    with st.expander("📊 Rapport du lot"):
+        for job in jobs:
+            if job.status == STATUS_FAILED:
+                st.error(f"❌ {job.name} : {job.error}")
+            for skipped in job.skipped:
+                st.warning(f"⚠️ {job.name} : {skipped}")
+    if st.button("✖ Fermer le rapport", key="close_batch", use_container_width=True):
+        # PDF écrits dans le dossier de sortie : seules les tâches sont retirées
+        for job in jobs:
+            job_manager.discard(job.id)
+        st.session_state.batch_job_ids = []
+        st.rerun()
+
+
+# La tâche de la session est retrouvée via l'URL après un rafraîchissement
+if st.session_state.job_id is None and job_manager.get(st.query_params.get("job")) is not None:
+    st.session_state.job_id = st.query_params["job"]
+current_job = job_manager.get(st.session_state.job_id)
+st.session_state.processing = current_job is not None and current_job.active
+
 # -------------------------------------------------
 # DISPLAY LOGO
 # -------------------------------------------------
@@ -362,7 +496,7 @@ display_logo()
 # -------------------------------------------------
 st.markdown("<div class='section-title'>📁 Méthode de Sélection</div>", unsafe_allow_html=True)
 
-tab1, tab2 = st.tabs(["📂 **Par Dossier**", "📄 **Par Fichiers**"])
+tab1, tab2, tab3 = st.tabs(["📂 **Par Dossier**", "📄 **Par Fichiers**", "📚 **Par Lot**"])
 
 with tab1:
     st.markdown("<div class='card'><h4 style='color:#32CD32; margin-bottom:15px;'>"
@@ -420,7 +554,7 @@ with tab1:
         with col1:
             sort_method = st.selectbox(
                 "Trier les images par :",
-                ["nom", "date_creation", "taille", "type"],
+                ["nom", "date_creation", "date_prise_vue", "taille", "type"],
                 index=0,
                 help="Choisissez la méthode de tri des images"
             )
@@ -436,55 +570,38 @@ with tab1:
 
         # Lire les images du dossier
         try:
-            all_files = os.listdir(st.session_state.folder)
-            image_files = [f for f in all_files
-                           if Path(f).suffix.lower() in ALLOWED_EXTENSIONS]
-
-            if image_files:
-                # Trier les images
-                sorted_images = sort_images(image_files, st.session_state.sort_method)
-                if reverse_order:
-                    sorted_images = list(reversed(sorted_images))
+            folder_index = get_folder_index(st.session_state.folder)
+            sorted_images = folder_index.sorted_names(st.session_state.sort_method, reverse_order)
 
+            if sorted_images:
                 st.markdown(f"<div class='status-box success'>✅ {len(sorted_images)} images trouvées</div>",
                             unsafe_allow_html=True)
 
+                # Sélection conservée tant que le dossier ne change pas
+                if st.session_state.selection_folder != st.session_state.folder:
+                    st.session_state.selection = Selection()
+                    st.session_state.selection_folder = st.session_state.folder
+                selection = st.session_state.selection
+
                 # Sélection multiple d'images
                 st.write("### Sélectionnez les images à inclure :")
-
-                # Cases à cocher pour toutes les images
-                all_selected = st.checkbox("Tout sélectionner", value=True)
-
-                # Grille de sélection
-                cols = st.columns(4)
-                selected_images = []
-
-                for idx, img_file in enumerate(sorted_images):
-                    with cols[idx % 4]:
-                        if all_selected or st.checkbox(img_file, value=all_selected, key=f"img_{idx}"):
-                            selected_images.append(img_file)
-
+                col1, col2, col3 = st.columns([1, 1, 2])
+                with col1:
+                    if st.button("☑️ Tout sélectionner", use_container_width=True):
+                        selection.set_all(True)
+                with col2:
+                    if st.button("⬜ Tout désélectionner", use_container_width=True):
+                        selection.set_all(False)
+
+                # Grille de sélection paginée
+                folder = st.session_state.folder
+                show_image_grid(sorted_images, lambda name: os.path.join(folder, name), "grille_dossier",
+                                selection)
+
+                selected_images = selection.selected(sorted_images)
                 st.session_state.selected_images = selected_images
-
-                # Aperçu des images sélectionnées
-                if selected_images:
-                    st.write(f"### Aperçu ({len(selected_images)} images sélectionnées)")
-
-                    # Limiter l'aperçu
-                    preview_images = selected_images[:MAX_PREVIEW_IMAGES]
-                    cols_preview = st.columns(min(4, len(preview_images)))
-
-                    for idx, img_file in enumerate(preview_images):
-                        with cols_preview[idx % 4]:
-                            try:
-                                img_path = os.path.join(st.session_state.folder, img_file)
-                                image = Image.open(img_path)
-                                st.image(image, caption=img_file, use_column_width=True)
-                            except:
-                                st.text(f"📄 {img_file}")
-
-                    if len(selected_images) > MAX_PREVIEW_IMAGES:
-                        st.info(f"... et {len(selected_images) - MAX_PREVIEW_IMAGES} autres images")
+                with col3:
+                    st.write(f"**{len(selected_images)} / {len(sorted_images)} images sélectionnées**")
 
             else:
                 st.markdown("<div class='status-box warning'>⚠️ Aucune image trouvée dans ce dossier</div>",
@@ -509,175 +626,349 @@ with tab2:
     )
 
     if uploaded_files:
-        st.session_state.uploaded_files = uploaded_files
+        uploads = spool_uploads(uploaded_files)
+        st.session_state.uploaded_files = uploads
         st.session_state.current_tab = "fichiers"
 
         st.markdown("<div class='sort-controls'>", unsafe_allow_html=True)
         sort_method_files = st.selectbox(
             "Trier les fichiers par :",
-            ["nom", "taille", "type"],
+            ["nom", "date_prise_vue", "taille", "type"],
             index=0,
             key="sort_files"
         )
         st.markdown("</div>", unsafe_allow_html=True)
 
         # Préparer la liste des fichiers
-        file_list = [f.name for f in uploaded_files]
-        sorted_files = sort_images(file_list, sort_method_files)
+        files_by_name = {upload.name: upload for upload in uploads}
+        file_list = list(files_by_name)
+        file_sizes = {upload.name: upload.size for upload in uploads}
+        sorted_files = sort_images(file_list, sort_method_files, size_of=file_sizes.get,
+                                   path_of=lambda name: files_by_name[name].path)
 
-        st.markdown(f"<div class='status-box success'>✅ {len(uploaded_files)} fichiers chargés</div>",
+        st.markdown(f"<div class='status-box success'>✅ {len(uploads)} fichiers chargés</div>",
                     unsafe_allow_html=True)
 
         # Afficher les fichiers
         st.write("### Fichiers chargés :")
-        cols = st.columns(4)
-
-        for idx, file in enumerate(sorted_files):
-            with cols[idx % 4]:
-                # Afficher un aperçu miniature
-                try:
-                    img = Image.open(uploaded_files[idx])
-                    st.image(img, caption=file, use_column_width=True)
-                except:
-                    st.text(f"📄 {file}")
+        show_image_grid(sorted_files, lambda name: files_by_name[name].path, "grille_fichiers")
 
+with tab3:
+    st.markdown("<div class='card'><h4 style='color:#32CD32; margin-bottom:15px;'>"
+                "📚 Conversion par Lot</h4>", unsafe_allow_html=True)
 
-# -------------------------------------------------
-# PDF CREATION FUNCTIONS
-# -------------------------------------------------
-def create_pdf_from_folder(folder_path, image_files):
-    """Crée un PDF à partir d'images d'un dossier"""
-    images = []
-    total = len(image_files)
-
-    if total == 0:
-        raise ValueError("Aucune image sélectionnée")
-
-    # Barre de progression
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-
-    try:
-        for idx, filename in enumerate(image_files):
-            # Mettre à jour la progression
-            progress = (idx + 1) / total
-            progress_bar.progress(progress)
-            status_text.text(f"📄 Traitement : {filename} ({idx + 1}/{total})")
-
-            try:
-                img_path = os.path.join(folder_path, filename)
-                img = Image.open(img_path).convert("RGB")
-
-                # Option de redimensionnement
-                max_dimension = st.session_state.get("max_dimension", 2000)
-                if max(img.size) > max_dimension:
-                    ratio = max_dimension / max(img.size)
-                    new_size = (int(img.size[0] * ratio), int(img.size[1] * ratio))
-                    img = img.resize(new_size, Image.Resampling.LANCZOS)
+    batch_root = st.text_input(
+        "Dossier racine :",
+        placeholder="Ex: C:/Users/OGEF/Archives",
+        help="Chaque sous-dossier contenant des images donnera un PDF"
+    )
+    batch_output = st.text_input(
+        "Dossier de sortie :",
+        placeholder="Par défaut : sous-dossier PDF du dossier racine",
+        help="Dossier où seront écrits les PDF"
+    )
 
-                images.append(img)
+    batch_retries = st.number_input(
+        "Tentatives par image en échec :", min_value=0, max_value=5,
+        value=DEFAULT_RETRIES, step=1,
+        help="Les dossiers passent par la file de conversion du serveur, partagée avec "
+             "les autres utilisateurs"
+    )
 
-            except Exception as e:
-                st.warning(f"⚠️ Image ignorée : {filename} - {str(e)}")
-                continue
-
-        if not images:
-            raise ValueError("Aucune image valide n'a pu être traitée")
-
-        # Créer le PDF
-        status_text.text("🎯 Création du PDF en cours...")
-        pdf_bytes = io.BytesIO()
-
-        # Options de qualité
-        quality = st.session_state.get("pdf_quality", 95)
-
-        images[0].save(
-            pdf_bytes,
-            format='PDF',
-            save_all=True,
-            append_images=images[1:],
-            quality=quality,
-            optimize=True
-        )
-        pdf_bytes.seek(0)
+    if batch_root and os.path.isdir(batch_root):
+        output_dir = batch_output or os.path.join(batch_root, "PDF")
+        jobs = plan_batch(batch_root, output_dir)
 
-        # Nettoyer
-        for img in images:
-            img.close()
+        if jobs:
+            st.markdown(f"<div class='status-box success'>✅ {len(jobs)} dossiers à convertir</div>",
+                        unsafe_allow_html=True)
 
-        progress_bar.empty()
-        status_text.empty()
+            batch_active = any(job is not None and job.active
+                               for job in map(job_manager.get, st.session_state.batch_job_ids))
+            if st.button("📚 **Convertir le lot**", use_container_width=True, disabled=batch_active):
+                st.session_state.batch_output_dir = output_dir
+                st.session_state.batch_job_ids = submit_batch(
+                    jobs,
+                    max_dimension=st.session_state.get("max_dimension", DEFAULT_MAX_DIMENSION),
+                    quality=st.session_state.get("pdf_quality", DEFAULT_QUALITY),
+                    jpeg_passthrough=st.session_state.get("jpeg_passthrough", True),
+                    compression=st.session_state.get("compression", DEFAULT_COMPRESSION),
+                    auto_levels=st.session_state.get("auto_levels", False),
+                    ocr=st.session_state.get("ocr"),
+                    drop_similar=st.session_state.get("drop_similar", False),
+                    retries=batch_retries,
+                    cache=get_page_cache() if st.session_state.get("use_page_cache", True) else None,
+                )
+        else:
+            st.markdown("<div class='status-box warning'>⚠️ Aucun sous-dossier contenant des images</div>",
+                        unsafe_allow_html=True)
 
-        return pdf_bytes, len(images)
+    # Suivi du lot en cours ou terminé, conservé entre les reruns
+    if st.session_state.batch_job_ids:
+        show_batch_progress(st.session_state.batch_job_ids, st.session_state.batch_output_dir)
 
-    except Exception as e:
-        progress_bar.empty()
-        status_text.empty()
-        raise e
 
+# -------------------------------------------------
+# PDF CREATION FUNCTIONS
+# -------------------------------------------------
+def conversion_options():
+    """Réglages de conversion choisis dans la barre latérale"""
+    return dict(
+        max_dimension=st.session_state.get("max_dimension", DEFAULT_MAX_DIMENSION),
+        quality=st.session_state.get("pdf_quality", DEFAULT_QUALITY),
+        jpeg_passthrough=st.session_state.get("jpeg_passthrough", True),
+        compression=st.session_state.get("compression", DEFAULT_COMPRESSION),
+        auto_levels=st.session_state.get("auto_levels", False),
+        ocr=st.session_state.get("ocr"),
+        drop_similar=st.session_state.get("drop_similar", False),
+        workers=st.session_state.get("workers", DEFAULT_WORKERS),
+        cache=get_page_cache() if st.session_state.get("use_page_cache", True) else None,
+    )
 
-def create_pdf_from_uploaded_files(uploaded_files):
-    """Crée un PDF à partir de fichiers uploadés"""
-    images = []
-    total = len(uploaded_files)
 
-    if total == 0:
-        raise ValueError("Aucun fichier sélectionné")
+def split_limits():
+    """Limites de découpage en plusieurs PDF choisies dans la barre latérale"""
+    if not st.session_state.get("split_output"):
+        return {}
+    return dict(
+        max_pages=st.session_state.split_max_pages or None,
+        max_bytes=st.session_state.split_max_mb * 1024 * 1024 or None,
+    )
 
-    progress_bar = st.progress(0)
-    status_text = st.empty()
 
-    try:
-        for idx, uploaded_file in enumerate(uploaded_files):
-            progress = (idx + 1) / total
-            progress_bar.progress(progress)
-            status_text.text(f"📄 Traitement : {uploaded_file.name} ({idx + 1}/{total})")
+def preflight(items):
+    """Lit les en-têtes avant conversion : écarte les fichiers illisibles et
+    affiche l'estimation du nombre de pages, de la taille et de la durée.
 
-            try:
-                img = Image.open(uploaded_file).convert("RGB")
+    ``items`` : triplets ``(chemin, date de modification, taille)`` déjà
+    connus (index du dossier, copies des uploads). Exécuté à chaque rerun :
+    aucun accès disque pour les en-têtes déjà lus.
+    """
+    sources = [path for path, _, _ in items]
+    sizes = {path: size for path, _, size in items}
+    infos = [probe_known(*item) for item in items]
+    invalid = [(source, info) for source, info in zip(sources, infos) if not info.valid]
+    if invalid:
+        with st.expander(f"⚠️ {len(invalid)} fichier(s) illisible(s), exclu(s) de la conversion"):
+            for source, info in invalid:
+                st.text(f"{os.path.basename(source)} : {info.error}")
+
+    valid = [(source, info) for source, info in zip(sources, infos) if info.valid]
+    options = conversion_options()
+    estimate = estimate_conversion(
+        [(info, sizes[source]) for source, info in valid],
+        max_dimension=options["max_dimension"],
+        quality=options["quality"],
+        jpeg_passthrough=options["jpeg_passthrough"] and not options["auto_levels"],
+        workers=options["workers"],
+        calibration=st.session_state.get("calibration"),
+    )
+    if valid:
+        duration = (f"{estimate['seconds'] / 60:.0f} min" if estimate["seconds"] >= 120
+                    else f"{max(1, round(estimate['seconds']))} s")
+        st.caption(f"📐 Estimation : {estimate['pages']} pages · "
+                   f"~{estimate['bytes'] / (1024 * 1024):.1f} Mo · ~{duration}")
+    return [source for source, _ in valid]
 
-                max_dimension = st.session_state.get("max_dimension", 2000)
-                if max(img.size) > max_dimension:
-                    ratio = max_dimension / max(img.size)
-                    new_size = (int(img.size[0] * ratio), int(img.size[1] * ratio))
-                    img = img.resize(new_size, Image.Resampling.LANCZOS)
 
-                images.append(img)
+def submit_pdf_job(sources, output_path, pdf_name, append=False):
+    """Lance la conversion en arrière-plan et la rattache à la session (et à l'URL)"""
+    if not sources:
+        raise ValueError("Aucune image sélectionnée")
 
-            except Exception as e:
-                st.warning(f"⚠️ Fichier ignoré : {uploaded_file.name} - {str(e)}")
-                continue
+    limits = {} if append else split_limits()
+    job = job_manager.submit(sources, output_path, name=pdf_name, owner=st.session_state.session_id,
+                             append=append, **limits, **conversion_options())
+    st.session_state.job_id = job.id
+    st.query_params["job"] = job.id
+    return job
+
+
+def close_job(job):
+    """Retire la tâche terminée et son PDF temporaire"""
+    job_manager.discard(job.id)
+    st.session_state.job_id = None
+    st.query_params.pop("job", None)
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def show_job_progress(job_id):
+    """Avancement de la conversion, rafraîchi sans relancer toute la page"""
+    job = job_manager.get(job_id)
+    if job is None or not job.active:
+        # Conversion terminée : la page complète affiche le résultat
+        st.rerun()
+
+    st.progress(job.progress)
+    if job.status == STATUS_PENDING:
+        load = job_manager.load()
+        st.text(f"⏳ En attente : position {job_manager.queue_position(job_id)} dans la file "
+                f"({load['running']} conversion(s) en cours sur le serveur)")
+    elif job.total:
+        st.text(f"📄 Traitement : {job.current} ({job.done + 1}/{job.total})")
+    else:
+        st.text("⏳ Démarrage de la conversion...")
 
-        if not images:
-            raise ValueError("Aucun fichier valide n'a pu être traité")
+    if job.cancel_event.is_set():
+        st.info("⏹ Annulation en cours...")
+    elif st.button("⏹ Annuler la conversion", key="cancel_job", use_container_width=True):
+        job_manager.cancel(job_id)
+        st.rerun(scope="fragment")
 
-        status_text.text("🎯 Création du PDF en cours...")
-        pdf_bytes = io.BytesIO()
 
-        quality = st.session_state.get("pdf_quality", 95)
+def read_output(path):
+    """Lecture différée d'un fichier de résultat : le contenu n'est chargé
+    qu'au clic sur le bouton de téléchargement, pas à chaque rerun"""
+    return lambda: Path(path).read_bytes()
 
-        images[0].save(
-            pdf_bytes,
-            format='PDF',
-            save_all=True,
-            append_images=images[1:],
-            quality=quality,
-            optimize=True
-        )
-        pdf_bytes.seek(0)
 
-        for img in images:
-            img.close()
+def show_too_large(job, size):
+    """Résultat trop volumineux pour être téléchargé depuis le navigateur.
 
-        progress_bar.empty()
-        status_text.empty()
+    Un résultat temporaire peut être enregistré dans un dossier sans
+    relancer la conversion.
+    """
+    if job.keep_output:
+        st.info("ℹ️ PDF trop volumineux pour le téléchargement : "
+                "ouvrez-le depuis le dossier de destination")
+        return
+    if job.saved_to:
+        st.markdown(f"<div class='status-box success'>📁 Enregistré : {job.saved_to}</div>",
+                    unsafe_allow_html=True)
+        return
 
-        return pdf_bytes, len(images)
+    st.warning(f"⚠️ Résultat trop volumineux pour le téléchargement ({size // (1024 * 1024)} Mo, "
+               f"max {MAX_DOWNLOAD_BYTES // (1024 * 1024)} Mo) : enregistrez-le dans un dossier")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        target_dir = st.text_input("Dossier d'enregistrement :", key="save_result_dir",
+                                   value=st.session_state.get("output_folder") or "",
+                                   placeholder="Ex: C:/Users/OGEF/Documents")
+    with col2:
+        st.write("")
+        if st.button("💾 Enregistrer", key="save_result", use_container_width=True):
+            file_name = job.name if not job.split else Path(job.name).stem + ".zip"
+            if not target_dir or not os.path.isdir(target_dir):
+                st.error("❌ Dossier introuvable")
+            else:
+                try:
+                    job_manager.save_output(job.id, os.path.join(target_dir, file_name))
+                    st.rerun()
+                except (OSError, ValueError) as e:
+                    st.error(f"❌ Erreur : {e}")
+
+
+def show_job_result(job):
+    """Résultat d'une conversion terminée : téléchargement et détails"""
+    if job.status == STATUS_CANCELLED:
+        st.markdown("<div class='status-box warning'>⏹ Conversion annulée</div>", unsafe_allow_html=True)
+    elif job.status == STATUS_FAILED:
+        st.markdown(f"<div class='status-box error'>❌ Erreur : {job.error}</div>", unsafe_allow_html=True)
+    else:
+        if st.session_state.get("celebrated_job") != job.id:
+            st.session_state.celebrated_job = job.id
+            st.balloons()
+            # Les estimations suivantes s'appuient sur cette conversion
+            st.session_state.calibration = (calibrate(job.metrics.summary(), job.options["quality"])
+                                            or st.session_state.get("calibration"))
+        if job.append:
+            st.markdown(f"<div class='status-box success'>✅ {job.page_count} pages ajoutées au PDF "
+                        f"existant</div>", unsafe_allow_html=True)
+        elif job.split:
+            st.markdown(f"<div class='status-box success'>✅ {len(job.parts)} PDF créés avec succès ! "
+                        f"({job.page_count} images traitées)</div>", unsafe_allow_html=True)
+        else:
+            st.markdown(f"<div class='status-box success'>"
+                        f"✅ PDF créé avec succès ! ({job.page_count} images traitées)</div>",
+                        unsafe_allow_html=True)
+        for skipped in job.skipped:
+            st.warning(f"⚠️ Image ignorée : {skipped}")
+
+        if job.split and job.keep_output:
+            pdf_size = sum(os.path.getsize(path) for path, _ in job.parts)
+            st.markdown(f"<div class='status-box success'>📁 Enregistrés dans : "
+                        f"{os.path.dirname(job.output_path)}</div>", unsafe_allow_html=True)
+            st.table([{"Fichier": os.path.basename(path), "Pages": count,
+                       "Taille": f"{os.path.getsize(path) // 1024} Ko"} for path, count in job.parts])
+        elif job.split:
+            # Archive ZIP des parties, servie depuis le fichier
+            pdf_size = os.path.getsize(job.saved_to or job.output_path)
+            st.table([{"Fichier": name, "Pages": count} for name, count in job.parts])
+            if pdf_size <= MAX_DOWNLOAD_BYTES:
+                st.download_button(
+                    label=f"⬇ Télécharger les {len(job.parts)} PDF (ZIP)",
+                    data=read_output(job.output_path),
+                    file_name=Path(job.name).stem + ".zip",
+                    mime="application/zip",
+                    icon="📥",
+                    use_container_width=True,
+                    key="download_zip"
+                )
+            else:
+                show_too_large(job, pdf_size)
+        else:
+            pdf_size = os.path.getsize(job.saved_to or job.output_path)
+            if job.keep_output:
+                st.markdown(f"<div class='status-box success'>📁 Enregistré : {job.output_path}</div>",
+                            unsafe_allow_html=True)
 
-    except Exception as e:
-        progress_bar.empty()
-        status_text.empty()
-        raise e
+            # Bouton de téléchargement, fichier lu seulement au clic
+            if pdf_size <= MAX_DOWNLOAD_BYTES:
+                st.download_button(
+                    label=f"⬇ Télécharger {job.name}",
+                    data=read_output(job.output_path),
+                    file_name=job.name,
+                    mime="application/pdf",
+                    icon="📥",
+                    use_container_width=True,
+                    key="download_pdf"
+                )
+            else:
+                show_too_large(job, pdf_size)
+
+        # Statistiques
+        options = job.options
+        with st.expander("📊 Détails de la conversion"):
+            st.write(f"**Images traitées :** {job.page_count}")
+            st.write(f"**Qualité :** {options['quality']}%")
+            st.write(f"**Dimension max :** {options['max_dimension']}")
+            st.write(f"**JPEG sans recompression :** "
+                     f"{'Oui' if options['jpeg_passthrough'] else 'Non'}")
+            st.write(f"**Compression :** {COMPRESSION_LABELS[options['compression']]}")
+            st.write(f"**Niveaux automatiques :** {'Oui' if options['auto_levels'] else 'Non'}")
+            st.write(f"**Processus parallèles :** {options['workers']}")
+            if job.split:
+                limits = [f"{job.max_pages} pages"] if job.max_pages else []
+                limits += [f"{job.max_bytes // (1024 * 1024)} Mo"] if job.max_bytes else []
+                st.write(f"**Découpage :** {len(job.parts)} parties (max {' / '.join(limits)})")
+            st.write(f"**Taille du PDF :** {pdf_size // 1024} Ko")
+
+            # Répartition du temps par étape
+            summary = job.metrics.summary()
+            document = summary["document"]
+            st.write(f"**Durée totale :** {document['seconds']:.1f} s "
+                     f"({job.page_count / max(document['seconds'], 1e-3):.1f} pages/s)")
+            st.write(f"**Volume lu / écrit :** {summary['bytes_in'] // 1024} Ko / "
+                     f"{summary['bytes_out'] // 1024} Ko")
+            if summary["cached"] or summary["passthrough"]:
+                st.write(f"**Pages en cache / JPEG copiés :** "
+                         f"{summary['cached']} / {summary['passthrough']}")
+            if summary["duplicates"]:
+                st.write(f"**Pages identiques à une précédente :** {summary['duplicates']}")
+            if options.get("ocr"):
+                st.write(f"**Mots reconnus (OCR) :** {summary['words']}")
+            if document["peak_rss_mb"]:
+                st.write(f"**Pic mémoire par processus de conversion :** {document['peak_rss_mb']:.0f} Mo")
+
+            stage_total = sum(summary["stages"].values()) or 1
+            st.table([{"Étape": stage, "Durée (s)": f"{seconds:.2f}",
+                       "Part": f"{100 * seconds / stage_total:.0f} %"}
+                      for stage, seconds in summary["stages"].items()])
+            st.write(f"**Date :** {datetime.fromtimestamp(job.finished_at).strftime('%d/%m/%Y %H:%M')}")
+
+    if st.button("✖ Fermer", key="close_job"):
+        close_job(job)
+        st.rerun()
 
 
 # -------------------------------------------------
@@ -709,7 +1000,9 @@ with st.sidebar:
         "Dimension maximale :",
         options=["Original", "1000px", "1500px", "2000px", "2500px", "3000px"],
         index=3,
-        help="Redimensionner les images si elles sont trop grandes"
+        help="Redimensionner les images si elles sont trop grandes. Les pages compressées "
+             "sans perte (compression automatique) gardent leur définition d'origine et "
+             "sont seulement affichées à cette taille"
     )
 
     if max_dimension == "Original":
@@ -717,6 +1010,109 @@ with st.sidebar:
     else:
         st.session_state.max_dimension = int(max_dimension.replace("px", ""))
 
+    # Compression
+    compression = st.selectbox(
+        "Compression :",
+        options=list(COMPRESSION_LABELS),
+        format_func=COMPRESSION_LABELS.get,
+        index=list(COMPRESSION_LABELS).index(DEFAULT_COMPRESSION),
+        help="Automatique : compression sans perte (CCITT G4, Flate) pour les plans noir et blanc "
+             "et les pages à peu de couleurs (définition d'origine conservée), JPEG pour les photos"
+    )
+    st.session_state.compression = compression
+
+    # Niveaux automatiques
+    st.session_state.auto_levels = st.checkbox(
+        "Niveaux automatiques",
+        value=False,
+        help="Étire le contraste des scans ternes ou voilés (fond grisâtre, encre pâle). "
+             "Les JPEG sont alors toujours recompressés"
+    )
+
+    # Texte cherchable
+    ocr_ready = ocr_available()
+    st.session_state.ocr = DEFAULT_OCR_LANG if st.checkbox(
+        "Texte cherchable (OCR)",
+        value=False,
+        disabled=not ocr_ready,
+        help="Reconnaît le texte des pages (Tesseract, en français) et l'ajoute en couche "
+             "invisible : le PDF peut être recherché (numéros de parcelle...). Conversion "
+             "nettement plus lente ; les pages déjà reconnues sont réutilisées via le cache"
+             if ocr_ready else
+             "Indisponible : installez Tesseract (avec la langue française) et le module pytesseract"
+    ) else None
+
+    # Doublons
+    st.session_state.drop_similar = st.checkbox(
+        "Ignorer les doublons",
+        value=False,
+        help="Les images identiques ou quasi identiques à une image précédente (réexport, "
+             "copie « (1) ») ne donnent pas de nouvelle page. Sans cette option, les doublons "
+             "exacts sont conservés mais leur image n'est stockée qu'une fois dans le PDF"
+    )
+
+    # Intégration directe des JPEG
+    st.session_state.jpeg_passthrough = st.checkbox(
+        "Intégrer les JPEG sans recompression",
+        value=True,
+        help="Les JPEG qui n'ont pas besoin d'être redimensionnés sont copiés tels quels "
+             "dans le PDF : conversion plus rapide, sans perte de qualité"
+    )
+
+    # Parallélisme
+    cpu_count = os.cpu_count() or 1
+    st.session_state.workers = st.number_input(
+        "Processus parallèles :",
+        min_value=1,
+        max_value=cpu_count,
+        value=min(4, cpu_count),
+        step=1,
+        help="Nombre d'images décodées et redimensionnées simultanément"
+    )
+
+    # Destination
+    st.session_state.save_to_folder = st.checkbox(
+        "Enregistrer le PDF sur disque",
+        value=False,
+        help="Le PDF est écrit directement dans le dossier de destination (obligatoire pour "
+             "des fichiers chargés, dossier des images par défaut sinon). Au-delà de "
+             f"{MAX_DOWNLOAD_BYTES // (1024 * 1024)} Mo, taille maximale d'un téléchargement, "
+             "un PDF temporaire peut aussi être enregistré après la conversion"
+    )
+    if st.session_state.save_to_folder:
+        st.session_state.output_folder = st.text_input(
+            "Dossier de destination :",
+            placeholder="Par défaut : dossier des images",
+        )
+        st.session_state.append_existing = st.checkbox(
+            "Compléter le PDF s'il existe déjà",
+            value=False,
+            help="Les nouvelles images sont ajoutées à la fin du PDF (créé par ce convertisseur) "
+                 "sans retraiter les pages existantes"
+        )
+
+    # Découpage
+    st.session_state.split_output = st.checkbox(
+        "Découper en plusieurs PDF",
+        value=False,
+        help="Pour les portails qui refusent les fichiers trop volumineux : les parties sont "
+             "proposées dans une archive ZIP, ou enregistrées dans le dossier de destination"
+    )
+    if st.session_state.split_output:
+        st.session_state.split_max_mb = st.number_input(
+            "Taille max par PDF (Mo, 0 = sans limite) :", min_value=0, value=10, step=1
+        )
+        st.session_state.split_max_pages = st.number_input(
+            "Pages max par PDF (0 = sans limite) :", min_value=0, value=0, step=10
+        )
+
+    # Cache des pages
+    st.session_state.use_page_cache = st.checkbox(
+        "Réutiliser les pages déjà converties",
+        value=True,
+        help="Les images inchangées depuis une conversion précédente ne sont pas retraitées"
+    )
+
     st.markdown("---")
 
     # Statistiques
@@ -728,7 +1124,7 @@ with st.sidebar:
 
     elif st.session_state.current_tab == "fichiers" and st.session_state.uploaded_files:
         st.markdown("**📊 Statistiques :**")
-        total_size = sum(len(f.getvalue()) for f in st.session_state.uploaded_files) // 1024
+        total_size = sum(upload.size for upload in st.session_state.uploaded_files) // 1024
         st.info(f"• Fichiers chargés : {len(st.session_state.uploaded_files)}\n"
                 f"• Taille totale : {total_size} Ko")
 
@@ -742,65 +1138,52 @@ has_images = False
 if st.session_state.current_tab == "dossier" and st.session_state.selected_images:
     has_images = True
     source_type = "dossier"
-    image_count = len(st.session_state.selected_images)
+    folder_index = get_folder_index(st.session_state.folder)
+    entries = [folder_index.entry(filename) for filename in st.session_state.selected_images]
+    items = [(os.path.join(st.session_state.folder, entry.name), entry.mtime_ns, entry.size)
+             for entry in entries if entry is not None]
 
 elif st.session_state.current_tab == "fichiers" and st.session_state.uploaded_files:
     has_images = True
     source_type = "fichiers"
-    image_count = len(st.session_state.uploaded_files)
+    # Copies rangées par contenu : jamais modifiées
+    items = [(upload.path, 0, upload.size) for upload in st.session_state.uploaded_files]
 
 if has_images:
+    # Vérification des en-têtes avant de lancer la conversion
+    sources = preflight(items)
     col1, col2, col3 = st.columns([1, 2, 1])
 
     with col2:
-        if st.button("🚀 **Créer le PDF**", type="primary", use_container_width=True):
+        if st.button("🚀 **Créer le PDF**", type="primary", use_container_width=True,
+                     disabled=st.session_state.processing):
             try:
+                # Enregistrement direct dans un dossier, ou fichier temporaire à télécharger
+                output_path = None
+                append = False
+                # Fichiers chargés : pas de dossier d'images, la destination doit être indiquée
+                default_dir = st.session_state.folder if source_type == "dossier" else None
+                output_dir = st.session_state.get("output_folder") or default_dir
+                if st.session_state.save_to_folder and output_dir:
+                    output_path = os.path.join(output_dir, pdf_name)
+                    append = st.session_state.append_existing and os.path.exists(output_path)
+
+                current_job = submit_pdf_job(sources, output_path, pdf_name, append=append)
                 st.session_state.processing = True
 
-                with st.spinner("📄 Conversion en cours..."):
-                    if source_type == "dossier":
-                        pdf_data, processed_count = create_pdf_from_folder(
-                            st.session_state.folder,
-                            st.session_state.selected_images
-                        )
-                    else:
-                        pdf_data, processed_count = create_pdf_from_uploaded_files(
-                            st.session_state.uploaded_files
-                        )
-
-                # Succès
-                st.balloons()
-                st.markdown(f"<div class='status-box success'>"
-                            f"✅ PDF créé avec succès ! ({processed_count} images traitées)</div>",
-                            unsafe_allow_html=True)
-
-                # Bouton de téléchargement
-                st.download_button(
-                    label=f"⬇ Télécharger {pdf_name}",
-                    data=pdf_data,
-                    file_name=pdf_name,
-                    mime="application/pdf",
-                    icon="📥",
-                    use_container_width=True,
-                    key="download_pdf"
-                )
-
-                # Statistiques
-                with st.expander("📊 Détails de la conversion"):
-                    st.write(f"**Images traitées :** {processed_count}")
-                    st.write(f"**Qualité :** {pdf_quality}%")
-                    st.write(f"**Dimension max :** {max_dimension}")
-                    st.write(f"**Date :** {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-
             except Exception as e:
                 st.markdown(f"<div class='status-box error'>❌ Erreur : {str(e)}</div>",
                             unsafe_allow_html=True)
-
-            finally:
-                st.session_state.processing = False
-else:
+elif current_job is None:
     st.info("ℹ️ Veuillez sélectionner des images (par dossier ou fichiers) pour créer un PDF")
 
+# Conversion en arrière-plan : suivi, ou résultat conservé entre les reruns
+if current_job is not None:
+    if current_job.active:
+        show_job_progress(current_job.id)
+    else:
+        show_job_result(current_job)
+
 # -------------------------------------------------
 # FOOTER
 # -------------------------------------------------
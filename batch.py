@@ -0,0 +1,161 @@
+"""Conversion par lot : un PDF par sous-dossier d'un dossier racine.
+
+Les dossiers sont convertis par un ordonnanceur borné (nombre de
+conversions simultanées configurable) ; chaque tâche expose son statut et
+le rapport final récapitule pages écrites, images ignorées et erreurs.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from conversion import (DEFAULT_COMPRESSION, DEFAULT_MAX_DIMENSION, DEFAULT_QUALITY, DEFAULT_WORKERS,
+                        list_images, write_pdf_to_file)
+from folder_index import FolderIndex
+
+STATUS_PENDING = "en_attente"
+STATUS_RUNNING = "en_cours"
+STATUS_DONE = "termine"
+STATUS_FAILED = "echec"
+
+DEFAULT_CONCURRENCY = 2
+DEFAULT_RETRIES = 1
+
+
+@dataclass
+class BatchJob:
+    """Conversion d'un sous-dossier en un PDF"""
+    folder: str
+    output: str
+    status: str = STATUS_PENDING
+    image_count: int = 0
+    page_count: int = 0
+    skipped: list = field(default_factory=list)
+    error: str = ""
+    duration: float = 0.0
+
+    @property
+    def name(self):
+        return os.path.basename(self.folder)
+
+
+@dataclass
+class BatchReport:
+    """Récapitulatif d'une conversion par lot"""
+    jobs: list
+
+    @property
+    def succeeded(self):
+        return [job for job in self.jobs if job.status == STATUS_DONE]
+
+    @property
+    def failed(self):
+        return [job for job in self.jobs if job.status == STATUS_FAILED]
+
+    def to_dict(self):
+        return {
+            "total": len(self.jobs),
+            "succeeded": len(self.succeeded),
+            "failed": len(self.failed),
+            "pages": sum(job.page_count for job in self.jobs),
+            "jobs": [asdict(job) for job in self.jobs],
+        }
+
+    def summary(self):
+        """Résumé texte, une ligne par dossier"""
+        lines = []
+        for job in self.jobs:
+            if job.status == STATUS_DONE:
+                detail = f"{job.page_count}/{job.image_count} pages"
+                if job.skipped:
+                    detail += f", {len(job.skipped)} ignorée(s)"
+            else:
+                detail = job.error or job.status
+            lines.append(f"{job.name} : {job.status} ({detail}, {job.duration:.1f} s)")
+        lines.append(f"Total : {len(self.succeeded)}/{len(self.jobs)} PDF créés, "
+                     f"{sum(job.page_count for job in self.jobs)} pages")
+        return "\n".join(lines)
+
+
+def find_dossiers(root):
+    """Sous-dossiers directs de ``root`` contenant au moins une image"""
+    folders = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir() and list_images(entry.path):
+                folders.append(entry.path)
+    return sorted(folders)
+
+
+def plan_batch(root, output_dir):
+    """Crée une tâche par sous-dossier, avec le PDF nommé d'après le dossier"""
+    return [BatchJob(folder=folder, output=os.path.join(output_dir, os.path.basename(folder) + ".pdf"))
+            for folder in find_dossiers(root)]
+
+
+def run_job(job, sort_by="nom", max_dimension=DEFAULT_MAX_DIMENSION, quality=DEFAULT_QUALITY,
+            jpeg_passthrough=True, compression=DEFAULT_COMPRESSION, auto_levels=False, ocr=None,
+            drop_similar=False, workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, cache=None):
+    """Convertit un dossier en PDF et met à jour le statut de la tâche"""
+    started = time.perf_counter()
+    job.status = STATUS_RUNNING
+
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(job.output)), exist_ok=True)
+        names = FolderIndex(job.folder).sorted_names(sort_by)
+        sources = [os.path.join(job.folder, name) for name in names]
+        job.image_count = len(sources)
+
+        job.page_count = write_pdf_to_file(
+            sources,
+            job.output,
+            max_dimension=max_dimension,
+            quality=quality,
+            jpeg_passthrough=jpeg_passthrough,
+            compression=compression,
+            auto_levels=auto_levels,
+            ocr=ocr,
+            drop_similar=drop_similar,
+            workers=workers,
+            retries=retries,
+            cache=cache,
+            on_error=lambda name, error: job.skipped.append(f"{name} : {error}"),
+        )
+        job.status = STATUS_DONE
+
+    except Exception as e:
+        job.error = str(e)
+        job.status = STATUS_FAILED
+
+    finally:
+        job.duration = time.perf_counter() - started
+
+    return job
+
+
+def run_batch(jobs, concurrency=DEFAULT_CONCURRENCY, on_update=None, **options):
+    """Exécute les tâches avec au plus ``concurrency`` conversions simultanées.
+
+    ``on_update(job)`` est appelé au démarrage et à la fin de chaque tâche
+    (depuis les threads de conversion). Les autres options sont transmises
+    à :func:`run_job`.
+    """
+    lock = threading.Lock()
+
+    def notify(job):
+        if on_update:
+            with lock:
+                on_update(job)
+
+    def execute(job):
+        job.status = STATUS_RUNNING
+        notify(job)
+        run_job(job, **options)
+        notify(job)
+        return job
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        list(executor.map(execute, jobs))
+
+    return BatchReport(jobs)
@@ -0,0 +1,182 @@
+"""Banc d'essai du pipeline Images → PDF.
+
+Génère localement des corpus synthétiques reproductibles (JPEG, PNG, TIFF
+multipage, grands scans), convertit chacun avec plusieurs combinaisons de
+réglages et enregistre pages/s, pic de mémoire (RSS) et taille du PDF dans un
+fichier JSON, pour comparer les versions entre elles.
+
+Chaque configuration est mesurée dans un processus neuf afin que le pic de
+mémoire d'un essai n'influence pas le suivant.
+
+Exemples :
+    python benchmarks/bench_conversion.py -o bench.json
+    python benchmarks/bench_conversion.py --quick --corpus jpeg large_scan
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PIL  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from conversion import write_pdf  # noqa: E402
+from metrics import StatsCollector, peak_rss_mb  # noqa: E402
+
+
+# -------------------------------------------------
+# CORPUS SYNTHÉTIQUES
+# -------------------------------------------------
+# nom : (format, extension, taille en pixels, images par fichier)
+CORPORA = {
+    "jpeg": ("JPEG", ".jpg", (3000, 2000), 1),
+    "png": ("PNG", ".png", (2480, 3508), 1),
+    "tiff_multipage": ("TIFF", ".tif", (2480, 3508), 4),
+    "large_scan": ("JPEG", ".jpg", (7000, 9900), 1),
+}
+
+
+def synthetic_page(size, seed):
+    """Page reproductible : fond texturé et tracés façon plan de géomètre"""
+    rng = random.Random(seed)
+    width, height = size
+    extent = (-2.0 + rng.random() * 0.2, -1.2, 0.8, 1.2)
+    base = Image.effect_mandelbrot((width // 4, height // 4), extent, 64)
+    page = base.resize(size, Image.Resampling.BILINEAR).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    page = Image.blend(page, gradient, 0.5)
+
+    draw = ImageDraw.Draw(page)
+    for _ in range(200):
+        points = [(rng.randrange(width), rng.randrange(height)) for _ in range(2)]
+        draw.line(points, fill=(rng.randrange(256), 0, 0), width=rng.randint(1, 4))
+    return page
+
+
+def generate_corpus(name, directory, pages):
+    """Écrit ``pages`` pages du corpus ``name`` dans ``directory``"""
+    fmt, ext, size, frames_per_file = CORPORA[name]
+    os.makedirs(directory, exist_ok=True)
+    file_count = max(1, pages // frames_per_file)
+    paths = []
+
+    for idx in range(file_count):
+        path = os.path.join(directory, f"{name}_{idx:04d}{ext}")
+        paths.append(path)
+        if os.path.exists(path):
+            continue
+        frames = [synthetic_page(size, seed=idx * 100 + f) for f in range(frames_per_file)]
+        if fmt == "JPEG":
+            frames[0].save(path, format=fmt, quality=90)
+        elif frames_per_file > 1:
+            frames[0].save(path, format=fmt, save_all=True, append_images=frames[1:],
+                           compression="tiff_lzw")
+        else:
+            frames[0].save(path, format=fmt)
+    return paths
+
+
+# -------------------------------------------------
+# MESURE
+# -------------------------------------------------
+def _run_config(sources, options):
+    """Exécuté dans un processus neuf : convertit et mesure.
+
+    Les processus de conversion sont démarrés par un serveur dédié
+    (forkserver), pas par ce processus : leur pic est celui qu'ils relèvent
+    eux-mêmes pour chaque page (``DocumentMetrics.peak_rss_mb``).
+    """
+    output = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    metrics = StatsCollector()
+    try:
+        started = time.perf_counter()
+        with output:
+            page_count = write_pdf(sources, output, metrics=metrics, **options)
+        elapsed = time.perf_counter() - started
+        return {
+            "pages": page_count,
+            "seconds": round(elapsed, 3),
+            "pages_per_sec": round(page_count / elapsed, 2) if elapsed else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": metrics.document.peak_rss_mb,
+            "output_bytes": os.path.getsize(output.name),
+        }
+    finally:
+        os.remove(output.name)
+
+
+def run_benchmarks(corpora, pages, configs, work_dir):
+    results = []
+    for name in corpora:
+        sources = generate_corpus(name, os.path.join(work_dir, name), pages)
+        for options in configs:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                measures = executor.submit(_run_config, sources, options).result()
+            record = dict(corpus=name, **options, **measures)
+            results.append(record)
+            print(f"{name:15} dim={options['max_dimension']:>5} q={options['quality']:>3} "
+                  f"passthrough={options['jpeg_passthrough']!s:5} workers={options['workers']:>2} "
+                  f"{measures['pages_per_sec']:>7} p/s  {measures['peak_rss_mb']} Mo "
+                  f"(conversion {measures['children_peak_rss_mb']} Mo)  "
+                  f"{measures['output_bytes'] // 1024} Ko", file=sys.stderr)
+    return results
+
+
+def build_configs(max_dimensions, qualities, workers):
+    return [
+        {"max_dimension": dim, "quality": quality, "jpeg_passthrough": passthrough, "workers": count}
+        for dim, quality, passthrough, count
+        in itertools.product(max_dimensions, qualities, (False, True), workers)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai de la conversion Images → PDF")
+    parser.add_argument("--corpus", nargs="+", choices=sorted(CORPORA), default=sorted(CORPORA),
+                        help="Corpus à mesurer (défaut : tous)")
+    parser.add_argument("--pages", type=int, help="Pages par corpus (défaut : 40, 8 avec --quick)")
+    parser.add_argument("--max-dimension", type=int, nargs="+", default=[1500, 2000, 10000])
+    parser.add_argument("--quality", type=int, nargs="+", default=[85, 95])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "ogef_bench"),
+                        help="Dossier des corpus générés (réutilisés d'un lancement à l'autre)")
+    parser.add_argument("--quick", action="store_true",
+                        help="Mesure réduite : 2000 px et qualité 95 uniquement")
+    parser.add_argument("-o", "--output", default="bench_results.json",
+                        help="Fichier JSON des résultats")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.max_dimension, args.quality = [2000], [95]
+    if args.pages is None:
+        args.pages = 8 if args.quick else 40
+
+    configs = build_configs(args.max_dimension, args.quality, sorted(set(args.workers)))
+    results = run_benchmarks(args.corpus, args.pages, configs, args.work_dir)
+
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Résultats : {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
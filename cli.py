@@ -0,0 +1,214 @@
+"""Conversion Images → PDF en ligne de commande, sans interface Streamlit.
+
+Exemples :
+    python cli.py C:/Scans/Projet -o Projet.pdf
+    python cli.py "scans/*.tif" -o plans.pdf --sort date_creation --max-dimension 1500
+    python cli.py --batch C:/Archives -o C:/Archives_PDF --jobs 4 --report rapport.json
+    python cli.py C:/Scans/Projet -o Projet.pdf --max-size 10 --zip
+    python cli.py C:/Scans/Projet/nouveaux -o Projet.pdf --append
+    python cli.py C:/Scans/Projet -o Projet.pdf --ocr fra+eng
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from pathlib import Path
+
+from batch import DEFAULT_CONCURRENCY, DEFAULT_RETRIES, STATUS_RUNNING, plan_batch, run_batch
+from conversion import (ALLOWED_EXTENSIONS, DEFAULT_COMPRESSION, DEFAULT_MAX_DIMENSION, DEFAULT_QUALITY,
+                        SORT_METHODS, append_pdf, sort_images, write_pdf_to_file)
+from encoders import COMPRESSION_MODES
+from folder_index import FolderIndex
+from metrics import JsonLinesSink
+from ocr import DEFAULT_OCR_LANG
+from page_cache import DEFAULT_CACHE_BYTES, PageCache
+from splitting import write_pdf_parts, write_pdf_zip
+
+
+def collect_sources(inputs, sort_by="nom", reverse=False):
+    """Résout dossiers et motifs glob en une liste ordonnée de chemins d'images"""
+    sources = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            names = FolderIndex(pattern).sorted_names(sort_by)
+            sources.extend(os.path.join(pattern, name) for name in names)
+        else:
+            matches = [path for path in glob.glob(pattern)
+                       if os.path.isfile(path) and Path(path).suffix.lower() in ALLOWED_EXTENSIONS]
+            sources.extend(sort_images(matches, sort_by))
+
+    if reverse:
+        sources.reverse()
+    return sources
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Convertit des images (dossier ou motif glob) en un fichier PDF."
+    )
+    parser.add_argument("inputs", nargs="+",
+                        help="Dossier(s) ou motif(s) glob d'images, ou dossier racine avec --batch")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Fichier PDF à écrire, ou dossier de sortie avec --batch")
+    parser.add_argument("--sort", choices=SORT_METHODS, default="nom",
+                        help="Méthode de tri des images (défaut : nom)")
+    parser.add_argument("--reverse", action="store_true", help="Inverser l'ordre de tri")
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY,
+                        help=f"Qualité JPEG 1-100 (défaut : {DEFAULT_QUALITY})")
+    parser.add_argument("--max-dimension", type=int, default=DEFAULT_MAX_DIMENSION,
+                        help=f"Plus grand côté en pixels (défaut : {DEFAULT_MAX_DIMENSION}) ; les pages "
+                             "compressées sans perte gardent leur définition, affichées à cette taille")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Nombre de processus de conversion (défaut : nombre de cœurs ; "
+                             "1 par dossier en mode lot)")
+    parser.add_argument("--compression", choices=COMPRESSION_MODES, default=DEFAULT_COMPRESSION,
+                        help="auto : sans perte pour les pages noir et blanc ou à peu de couleurs ; "
+                             f"jpeg : toutes les pages en JPEG (défaut : {DEFAULT_COMPRESSION})")
+    parser.add_argument("--auto-levels", action="store_true",
+                        help="Étirer automatiquement les niveaux (scans ternes ou voilés)")
+    parser.add_argument("--ocr", nargs="?", const=DEFAULT_OCR_LANG, metavar="LANGUE",
+                        help="Ajouter une couche de texte cherchable reconnue par Tesseract, "
+                             f"langue(s) Tesseract (défaut : {DEFAULT_OCR_LANG} ; plusieurs : fra+eng)")
+    parser.add_argument("--drop-duplicates", action="store_true",
+                        help="Ignorer les images en double ou quasi identiques (réexports, copies)")
+    parser.add_argument("--no-jpeg-passthrough", action="store_true",
+                        help="Recompresser aussi les JPEG qui pourraient être copiés tels quels")
+    parser.add_argument("--max-pages", type=int,
+                        help="Découper en PDF d'au plus N pages (Projet_partie01.pdf, ...)")
+    parser.add_argument("--max-size", type=float,
+                        help="Découper en PDF d'au plus N Mo")
+    parser.add_argument("--zip", action="store_true",
+                        help="Avec --max-pages/--max-size : réunir les parties dans <sortie>.zip")
+    parser.add_argument("--append", action="store_true",
+                        help="Ajouter les images à la fin du PDF existant, sans réécrire ses pages "
+                             "(PDF créé par ce convertisseur)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Créer un PDF par sous-dossier du dossier racine")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Conversions simultanées en mode lot (défaut : {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help=f"Nouvelles tentatives par image en échec (défaut : {DEFAULT_RETRIES})")
+    parser.add_argument("--report", help="Fichier JSON où écrire le rapport du lot")
+    parser.add_argument("--cache-dir",
+                        help="Dossier du cache de pages (réutilise les pages déjà converties)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help="Taille maximale du cache de pages en Mo")
+    parser.add_argument("--metrics",
+                        help="Fichier JSON Lines où ajouter les mesures par page et par étape")
+    parser.add_argument("-q", "--quiet", action="store_true", help="N'afficher que les erreurs")
+    return parser
+
+
+def make_cache(args):
+    if not args.cache_dir:
+        return None
+    return PageCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+
+
+def run_batch_mode(args):
+    """Convertit chaque sous-dossier du dossier racine en un PDF"""
+    if len(args.inputs) != 1 or not os.path.isdir(args.inputs[0]):
+        print("Le mode lot attend un seul dossier racine", file=sys.stderr)
+        return 1
+
+    jobs = plan_batch(args.inputs[0], args.output)
+    if not jobs:
+        print("Aucun sous-dossier contenant des images", file=sys.stderr)
+        return 1
+
+    def on_update(job):
+        if not args.quiet and job.status != STATUS_RUNNING:
+            print(f"[{job.status}] {job.name}", file=sys.stderr)
+
+    report = run_batch(
+        jobs,
+        concurrency=args.jobs,
+        on_update=on_update,
+        sort_by=args.sort,
+        max_dimension=args.max_dimension,
+        quality=args.quality,
+        jpeg_passthrough=not args.no_jpeg_passthrough,
+        compression=args.compression,
+        auto_levels=args.auto_levels,
+        ocr=args.ocr,
+        drop_similar=args.drop_duplicates,
+        workers=1,
+        retries=args.retries,
+        cache=make_cache(args),
+    )
+
+    print(report.summary(), file=sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+    return 1 if report.failed else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.batch:
+        return run_batch_mode(args)
+    if args.append and (args.max_pages or args.max_size):
+        print("--append ne se combine pas avec --max-pages/--max-size", file=sys.stderr)
+        return 1
+
+    sources = collect_sources(args.inputs, args.sort, args.reverse)
+    if not sources:
+        print("Aucune image trouvée", file=sys.stderr)
+        return 1
+
+    def on_progress(idx, total, name):
+        if not args.quiet:
+            print(f"[{idx + 1}/{total}] {name}", file=sys.stderr)
+
+    def on_error(name, error):
+        print(f"Image ignorée : {name} - {error}", file=sys.stderr)
+
+    metrics = JsonLinesSink(args.metrics) if args.metrics else None
+    options = dict(
+        max_dimension=args.max_dimension,
+        quality=args.quality,
+        jpeg_passthrough=not args.no_jpeg_passthrough,
+        compression=args.compression,
+        auto_levels=args.auto_levels,
+        ocr=args.ocr,
+        drop_similar=args.drop_duplicates,
+        workers=args.workers,
+        cache=make_cache(args),
+        metrics=metrics,
+        on_progress=on_progress,
+        on_error=on_error,
+    )
+    limits = dict(max_pages=args.max_pages,
+                  max_bytes=int(args.max_size * 1024 * 1024) if args.max_size else None)
+    try:
+        if args.append and os.path.exists(args.output):
+            page_count = append_pdf(sources, args.output, **options)
+            outputs = [(args.output, page_count)]
+        elif not (args.max_pages or args.max_size):
+            page_count = write_pdf_to_file(sources, args.output, **options)
+            outputs = [(args.output, page_count)]
+        elif args.zip:
+            zip_path = os.path.splitext(args.output)[0] + ".zip"
+            parts = write_pdf_zip(sources, zip_path, os.path.basename(args.output), **limits, **options)
+            outputs = [(f"{zip_path}:{name}", count) for name, count in parts]
+        else:
+            outputs = write_pdf_parts(sources, os.path.dirname(os.path.abspath(args.output)),
+                                      os.path.basename(args.output), **limits, **options)
+    except Exception as e:
+        print(f"Erreur : {e}", file=sys.stderr)
+        return 1
+    finally:
+        if metrics is not None:
+            metrics.close()
+
+    if not args.quiet:
+        for path, page_count in outputs:
+            print(f"{path} : {page_count} pages", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
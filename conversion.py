@@ -0,0 +1,660 @@
+"""Cœur de conversion Images → PDF, indépendant de l'interface Streamlit.
+
+Les pages sont décodées, redimensionnées, compressées puis écrites une par
+une : la mémoire utilisée reste bornée par la taille d'une page, quel que soit
+le nombre d'images sélectionnées. Les très grandes images sont traitées par
+bandes (voir :mod:`strips`).
+"""
+import os
+import re
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from multiprocessing import get_all_start_methods, get_context, parent_process
+
+from pathlib import Path
+
+from PIL import Image, ImageSequence
+
+from dedup import HASH_SIZE, DuplicateFinder, DuplicatePage, SimilarPages, perceptual_hash
+from encoders import classify, encode_bilevel, encode_image, encode_jpeg
+from metrics import DocumentMetrics, PageMetrics, PeakMemory, peak_rss_mb
+from normalize import normalize
+from ocr import check_ocr, recognize_page
+from pdf_writer import ImagePayload, StreamingPdfWriter, read_pdf_state
+from probe import capture_date, probe_image
+from strips import LARGE_IMAGE_PIXELS, encode_bands, open_image, reduce_bands, reduction_factor
+
+DEFAULT_MAX_DIMENSION = 2000
+DEFAULT_QUALITY = 95
+DEFAULT_WORKERS = 1
+DEFAULT_COMPRESSION = "auto"
+# Démarrage des processus de conversion : jamais par fork du serveur
+# Streamlit, dont les threads (verrous compris) seraient copiés en l'état
+START_METHOD = "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+# Résultats de pages conservés pour leurs doublons proches
+RECENT_RESULTS = 16
+
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp', '.webp', '.gif'}
+# Formats dont chaque image (TIFF multipage, GIF) devient une page du PDF
+MULTI_FRAME_EXTENSIONS = {'.tif', '.tiff', '.gif'}
+SORT_METHODS = ["nom", "date_creation", "date_prise_vue", "taille", "type"]
+
+# Modes JPEG pouvant être intégrés tels quels dans un flux DCTDecode
+PASSTHROUGH_COLOR_SPACES = {"RGB": "DeviceRGB", "L": "DeviceGray"}
+
+
+class ConversionCancelled(Exception):
+    """Conversion interrompue à la demande de l'utilisateur"""
+
+
+# -------------------------------------------------
+# LISTE ET TRI DES IMAGES
+# -------------------------------------------------
+def list_images(folder):
+    """Liste les fichiers image d'un dossier (noms de fichiers)"""
+    return [f for f in os.listdir(folder)
+            if Path(f).suffix.lower() in ALLOWED_EXTENSIONS]
+
+
+def natural_sort_key(s):
+    """Clé de tri naturel pour les noms de fichiers"""
+    return [int(text) if text.isdigit() else text.lower()
+            for text in re.split(r'(\d+)', s)]
+
+
+def sort_images(image_list, sort_by="nom", folder="", size_of=None, path_of=None):
+    """Trie les images selon différents critères.
+
+    Les noms sont relatifs à ``folder`` (ou des chemins complets si ``folder``
+    est vide). ``size_of(nom)`` remplace la lecture de la taille sur disque
+    et ``path_of(nom)`` le chemin du fichier, par exemple pour des fichiers
+    uploadés.
+    """
+    if not image_list:
+        return []
+
+    if sort_by == "nom":
+        # Tri naturel (1, 2, 10 au lieu de 1, 10, 2)
+        return sorted(image_list, key=natural_sort_key)
+
+    elif sort_by == "date_creation":
+        # Trier par date de création (du plus ancien au plus récent)
+        def creation_time(img):
+            try:
+                return os.path.getctime(os.path.join(folder, img))
+            except OSError:
+                return 0
+
+        return sorted(image_list, key=creation_time)
+
+    elif sort_by == "date_prise_vue":
+        # Date de prise de vue EXIF, date de création du fichier à défaut
+        def shot_time(img):
+            return capture_date(path_of(img) if path_of else os.path.join(folder, img))
+
+        return sorted(image_list, key=shot_time)
+
+    elif sort_by == "taille":
+        # Trier par taille (croissante)
+        def size(img):
+            try:
+                if size_of is not None:
+                    return size_of(img) or 0
+                return os.path.getsize(os.path.join(folder, img))
+            except OSError:
+                return 0
+
+        return sorted(image_list, key=size)
+
+    elif sort_by == "type":
+        # Trier par type d'extension
+        return sorted(image_list, key=lambda x: Path(x).suffix.lower())
+
+    return sorted(image_list)
+
+
+# -------------------------------------------------
+# PRÉPARATION DES PAGES
+# -------------------------------------------------
+def source_name(source):
+    """Nom affichable d'une source (chemin local ou fichier uploadé)"""
+    name = getattr(source, "name", None)
+    if name:
+        return name
+    return os.path.basename(source)
+
+
+@dataclass(frozen=True)
+class PageRef:
+    """Une page à produire : une image (``frame``) d'une source"""
+    source: object
+    frame: int = 0
+    frame_count: int = 1
+
+
+def frame_count(source):
+    """Nombre d'images d'une source TIFF multipage ou GIF, 1 pour les autres formats.
+
+    Seul l'en-tête (et la chaîne des IFD d'un TIFF) est lu ; une source
+    illisible compte pour une page, l'erreur étant signalée à sa conversion.
+    """
+    if Path(source_name(source)).suffix.lower() not in MULTI_FRAME_EXTENSIONS:
+        return 1
+    return probe_image(source).frames
+
+
+def expand_pages(sources):
+    """Liste des pages (:class:`PageRef`) des sources, une par image de chaque fichier.
+
+    Les :class:`PageRef` déjà présents dans ``sources`` sont repris tels quels.
+    """
+    pages = []
+    for source in sources:
+        if isinstance(source, PageRef):
+            pages.append(source)
+            continue
+        count = frame_count(source)
+        pages.extend(PageRef(source, frame, count) for frame in range(count))
+    return pages
+
+
+def page_name(page):
+    """Nom affichable d'une page : nom de la source, suivi du numéro d'image si multipage"""
+    name = source_name(page.source)
+    if page.frame_count > 1:
+        return f"{name} [{page.frame + 1}/{page.frame_count}]"
+    return name
+
+
+# Réduction entière préalable (Image.reduce) tant que l'image reste au moins
+# 3 fois plus grande que la cible : résultat indiscernable, beaucoup plus rapide
+RESIZE_REDUCING_GAP = 3.0
+
+
+def fit_size(size, max_dimension):
+    """Taille finale d'une image limitée à max_dimension, ou None si inchangée"""
+    if max(size) <= max_dimension:
+        return None
+    ratio = max_dimension / max(size)
+    return int(size[0] * ratio), int(size[1] * ratio)
+
+
+def resize_to_fit(img, max_dimension, target=None):
+    """Réduit l'image pour que son plus grand côté ne dépasse pas max_dimension.
+
+    ``target`` impose la taille finale, calculée sur l'image d'origine quand
+    celle-ci a déjà été décodée en taille réduite.
+    """
+    target = target or fit_size(img.size, max_dimension)
+    if target and img.size != target:
+        img = img.resize(target, Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+    return img
+
+
+def draft_for_target(img, target):
+    """Décode un JPEG directement à l'échelle 1/2, 1/4 ou 1/8 la plus proche de la cible.
+
+    Sans effet pour les autres formats ; la taille obtenue reste au moins
+    égale à ``target`` pour que le redimensionnement final garde sa qualité.
+    """
+    if target and img.format == "JPEG":
+        img.draft("RGB" if img.mode == "RGB" else img.mode, target)
+
+
+def passthrough_payload(img, source, max_dimension):
+    """Renvoie le JPEG source sans recompression s'il peut être intégré tel quel"""
+    if img.format != "JPEG" or img.mode not in PASSTHROUGH_COLOR_SPACES:
+        return None
+    if max(img.size) > max_dimension:
+        return None
+
+    return ImagePayload(
+        data=Path(source).read_bytes(),
+        width=img.size[0],
+        height=img.size[1],
+        color_space=PASSTHROUGH_COLOR_SPACES[img.mode],
+    )
+
+
+
+
+def prepare_large_page(img, source, target, quality=DEFAULT_QUALITY, compression=DEFAULT_COMPRESSION,
+                       auto_levels=False, ocr=None, ocr_cache=None, fingerprint=False, page_metrics=None):
+    """Prépare une très grande image par bandes (voir :mod:`strips`).
+
+    ``target`` est la taille finale calculée sur l'image d'origine (None si
+    inchangée). Avec ``compression="auto"``, une image noir et blanc garde sa
+    définition d'origine en CCITT G4 ; les autres sont compressées en JPEG
+    (en niveaux de gris si l'image l'est). Une sortie encore trop grande est
+    écrite en plusieurs XObjects, sans niveaux automatiques (ils seraient
+    calculés bande par bande) ni OCR (l'image n'est jamais entière en mémoire).
+    """
+    stats = page_metrics if page_metrics is not None else PageMetrics()
+    if compression == "auto" and img.mode == "1":
+        with stats.stage("compression"):
+            payload = encode_bands(img, source, encode_bilevel)
+        payload.display_size = target
+        return payload
+
+    mode = "L" if compression == "auto" and img.mode == "L" else "RGB"
+    out_size = target or img.size
+    if out_size[0] * out_size[1] > LARGE_IMAGE_PIXELS:
+        # Réduction entière puis redimensionnement exact, bande par bande
+        factor = reduction_factor(img.size, out_size)
+        with stats.stage("compression"):
+            return encode_bands(img, source, lambda band: encode_jpeg(band, quality), factor, mode,
+                                target)
+
+    with stats.stage("reduction"):
+        page = reduce_bands(img, source, reduction_factor(img.size, out_size), mode)
+        page = resize_to_fit(page, max(out_size), out_size)
+    if auto_levels:
+        with stats.stage("conversion"):
+            page = normalize(page, levels=True)
+    text = []
+    if ocr:
+        with stats.stage("ocr"):
+            text = recognize_page(page, ocr, ocr_cache)
+    with stats.stage("compression"):
+        payload = encode_jpeg(page, quality)
+    if fingerprint:
+        payload.fingerprint = perceptual_hash(page)
+    payload.text = text
+    return payload
+
+
+def prepare_page(source, max_dimension=DEFAULT_MAX_DIMENSION, quality=DEFAULT_QUALITY,
+                 jpeg_passthrough=False, compression=DEFAULT_COMPRESSION, auto_levels=False,
+                 ocr=None, frame=0, ocr_cache=None, fingerprint=False, page_metrics=None):
+    """Décode, convertit, redimensionne et compresse une image source.
+
+    ``frame`` désigne l'image à convertir dans un TIFF multipage ou un GIF :
+    seule celle-ci est décodée. Avec ``jpeg_passthrough``, un JPEG qui n'a pas
+    besoin d'être réduit est intégré sans décodage ni recompression. Avec
+    ``compression="auto"``, les pages noir et blanc ou à peu de couleurs sont
+    compressées sans perte (voir :mod:`encoders`). Les couleurs sont
+    normalisées avant compression (16 bits, transparence, CMYK, niveaux
+    automatiques avec ``auto_levels`` : voir :mod:`normalize`). Avec ``ocr``
+    (langue Tesseract), le texte de la page préparée est reconnu, via le cache
+    OCR de ``ocr_cache`` (:class:`PageCache`) s'il est fourni (voir
+    :mod:`ocr`). Avec ``fingerprint``, l'empreinte perceptuelle de la page
+    préparée est calculée (voir :mod:`dedup`). Au-delà de LARGE_IMAGE_PIXELS,
+    l'image est traitée par bandes (:func:`prepare_large_page`). Les durées de
+    chaque étape sont ajoutées à ``page_metrics`` (:class:`PageMetrics`) s'il
+    est fourni.
+    """
+    stats = page_metrics if page_metrics is not None else PageMetrics()
+
+    with stats.stage("ouverture"):
+        img = open_image(source)
+        if frame:
+            img = ImageSequence.Iterator(img)[frame]
+
+    with img:
+        stats.pixels_in = img.size[0] * img.size[1]
+        payload = None
+        # Niveaux automatiques : le JPEG source doit être recompressé
+        if jpeg_passthrough and not frame and not auto_levels:
+            payload = passthrough_payload(img, source, max_dimension)
+            stats.passthrough = payload is not None
+            if payload is not None and ocr:
+                with stats.stage("ocr"):
+                    payload.text = recognize_page(img, ocr, ocr_cache)
+            if payload is not None and fingerprint:
+                with stats.stage("analyse"):
+                    # Décodage réduit, sauf si l'image est déjà décodée pour l'OCR
+                    img.draft("L", (4 * HASH_SIZE, 4 * HASH_SIZE))
+                    payload.fingerprint = perceptual_hash(img)
+
+        if payload is None:
+            target = fit_size(img.size, max_dimension)
+            with stats.stage("decodage"):
+                draft_for_target(img, target)
+            if img.size[0] * img.size[1] > LARGE_IMAGE_PIXELS:
+                payload = prepare_large_page(img, source, target, quality, compression, auto_levels,
+                                             ocr, ocr_cache, fingerprint, page_metrics=stats)
+
+        if payload is None:
+            with stats.stage("decodage"):
+                img.load()
+            with stats.stage("conversion"):
+                page = normalize(img, levels=auto_levels)
+
+            kind = "jpeg"
+            if compression == "auto":
+                with stats.stage("analyse"):
+                    kind, page = classify(page, img.format)
+
+            if kind == "jpeg":
+                keep_gray = compression == "auto" and page.mode == "L"
+                with stats.stage("conversion"):
+                    page = normalize(page, "L" if keep_gray else "RGB")
+                with stats.stage("reduction"):
+                    page = resize_to_fit(page, max_dimension, target)
+            try:
+                page_fingerprint = None
+                if fingerprint:
+                    with stats.stage("analyse"):
+                        page_fingerprint = perceptual_hash(page)
+                text = []
+                if ocr:
+                    with stats.stage("ocr"):
+                        text = recognize_page(page, ocr, ocr_cache)
+                with stats.stage("compression"):
+                    payload = encode_image(kind, page, quality)
+                payload.fingerprint = page_fingerprint
+                payload.text = text
+            finally:
+                page.close()
+
+            # Pages sans perte : définition d'origine, affichée à la taille réduite
+            if kind != "jpeg" and target:
+                payload.display_size = target
+
+    stats.pixels_out = payload.width * payload.height
+    stats.bytes_out = len(payload.data)
+    stats.words = len(payload.text)
+    return payload
+
+
+def load_page(page, digest=None, retries=0, cache=None, fingerprint=False, **options):
+    """Prépare une page (:class:`PageRef`) via le cache disque, en réessayant
+    ``retries`` fois en cas d'échec. ``digest`` est l'empreinte du contenu
+    source si elle est déjà connue (voir :class:`DuplicateFinder`).
+
+    ``fingerprint`` ne fait pas partie de la clé de cache : une page en cache
+    sans empreinte perceptuelle est préparée à nouveau si elle est demandée.
+
+    Renvoie le couple ``(payload, PageMetrics)``.
+    """
+    source = page.source
+    # La taille du fichier n'est comptée qu'une fois pour une source multipage
+    stats = PageMetrics(name=page_name(page), bytes_in=0 if page.frame else os.path.getsize(source))
+
+    if cache is not None:
+        with stats.stage("cache"):
+            key = cache.key(source, digest, frame=page.frame, **options)
+            payload = cache.get(key)
+        if payload is not None and (payload.fingerprint is not None or not fingerprint):
+            stats.cached = True
+            stats.pixels_out = payload.width * payload.height
+            stats.bytes_out = len(payload.data)
+            stats.words = len(payload.text)
+            return payload, stats
+
+    for attempt in range(retries + 1):
+        try:
+            payload = prepare_page(source, frame=page.frame, ocr_cache=cache, fingerprint=fingerprint,
+                                   page_metrics=stats, **options)
+            break
+        except Exception:
+            if attempt == retries:
+                raise
+
+    if cache is not None:
+        with stats.stage("cache"):
+            cache.put(key, payload)
+    # Pic mesuré seulement dans un processus de conversion dédié
+    if parent_process() is not None:
+        stats.peak_rss_mb = peak_rss_mb()
+    return payload, stats
+
+
+# -------------------------------------------------
+# PRÉPARATION PARALLÈLE
+# -------------------------------------------------
+def _make_executor(workers, use_processes):
+    """Pool de processus, de threads sans ``use_processes``.
+
+    Les sources sont des chemins locaux (les fichiers uploadés sont copiés
+    sur disque, voir :mod:`uploads`) : seul le chemin est transmis aux
+    processus fils.
+    """
+    if use_processes:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=get_context(START_METHOD))
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def _load_result(prepare, page, digest):
+    """Résultat de ``prepare(page, digest)``, ou l'exception levée"""
+    try:
+        return prepare(page, digest)
+    except Exception as e:
+        return e
+
+
+def iter_prepared_pages(pages, max_dimension=DEFAULT_MAX_DIMENSION, quality=DEFAULT_QUALITY,
+                        jpeg_passthrough=False, workers=DEFAULT_WORKERS, use_processes=True,
+                        retries=0, cache=None, compression=DEFAULT_COMPRESSION, auto_levels=False,
+                        ocr=None, drop_similar=False):
+    """Prépare les pages (:class:`PageRef`), éventuellement en parallèle, et
+    les renvoie dans l'ordre.
+
+    Génère des quadruplets ``(page, payload, mesures, erreur)`` ; au plus
+    ``2 × workers`` pages sont en cours de traitement à la fois, y compris
+    pour un TIFF de plusieurs centaines de pages. Une page identique à une
+    page précédente proche n'est pas préparée à nouveau (voir :mod:`dedup`) ; avec
+    ``drop_similar``, les doublons et quasi-doublons sont renvoyés avec une
+    erreur :class:`DuplicatePage`.
+
+    Avec ``ocr``, la reconnaissance de texte a lieu dans les processus de
+    préparation ; :class:`OcrUnavailable` est levée avant toute page si
+    Tesseract ou la langue demandée sont absents.
+    """
+    if ocr:
+        check_ocr(ocr)
+    prepare = partial(load_page, retries=retries, cache=cache, max_dimension=max_dimension,
+                      quality=quality, jpeg_passthrough=jpeg_passthrough, compression=compression,
+                      auto_levels=auto_levels, ocr=ocr, fingerprint=drop_similar)
+
+    finder = DuplicateFinder(pages)
+    # Résultats récents des pages pouvant avoir un doublon ; un doublon
+    # lointain est préparé à nouveau (son image reste partagée dans le PDF)
+    recent = OrderedDict()
+    available = set()
+    waiting = Counter()
+    similar = SimilarPages() if drop_similar else None
+
+    def plan(index):
+        """Page identique dont le résultat sera repris, ou None si la page est à préparer"""
+        previous = finder.previous(index)
+        reuse = previous in available
+        if reuse:
+            waiting[previous] += 1
+        if finder.can_repeat(index):
+            available.add(index)
+        return previous if reuse else None
+
+    def remember(index, result):
+        recent[index] = result
+        for old in list(recent):
+            if len(recent) <= RECENT_RESULTS:
+                break
+            if not waiting[old]:
+                del recent[old]
+                available.discard(old)
+
+    def finish(index, page, previous, result):
+        if previous is not None:
+            result = recent[previous]
+            waiting[previous] -= 1
+        if finder.can_repeat(index):
+            remember(index, result)
+
+        if isinstance(result, Exception):
+            return page, None, None, result
+        payload, stats = result
+        if previous is not None:
+            if similar is not None:
+                return page, None, None, DuplicatePage(f"doublon de {page_name(pages[previous])}")
+            stats = PageMetrics(name=page_name(page), duplicate=True)
+        if similar is not None:
+            try:
+                similar.check(page_name(page), payload.fingerprint)
+            except DuplicatePage as e:
+                return page, None, None, e
+        return page, payload, stats, None
+
+    if workers <= 1:
+        for index, page in enumerate(pages):
+            previous = plan(index)
+            result = None
+            if previous is None:
+                result = _load_result(prepare, page, finder.digest(page.source))
+            yield finish(index, page, previous, result)
+        return
+
+    executor = _make_executor(workers, use_processes)
+    pending = deque()
+    remaining = enumerate(pages)
+
+    def submit(index, page):
+        previous = plan(index)
+        future = None
+        if previous is None:
+            future = executor.submit(prepare, page, finder.digest(page.source))
+        pending.append((index, page, previous, future))
+
+    try:
+        for index, page in remaining:
+            submit(index, page)
+            if len(pending) >= 2 * workers:
+                break
+
+        while pending:
+            index, page, previous, future = pending.popleft()
+            following = next(remaining, None)
+            if following is not None:
+                submit(*following)
+
+            result = None
+            if future is not None:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+            yield finish(index, page, previous, result)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# -------------------------------------------------
+# CONSTRUCTION DU PDF
+# -------------------------------------------------
+def write_pdf(sources, fp, max_dimension=DEFAULT_MAX_DIMENSION, quality=DEFAULT_QUALITY,
+              jpeg_passthrough=False, workers=DEFAULT_WORKERS, use_processes=True,
+              compression=DEFAULT_COMPRESSION, auto_levels=False, ocr=None, drop_similar=False,
+              retries=0, cache=None, metrics=None, on_progress=None, on_error=None, cancel_event=None,
+              previous=None):
+    """Écrit un PDF dans ``fp`` en traitant les sources au fil de l'eau.
+
+    Chaque image d'un TIFF multipage ou d'un GIF devient une page.
+    ``on_progress(index, total, nom)`` est appelé à chaque page prête et
+    ``on_error(nom, exception)`` pour chaque image ignorée après
+    ``retries`` nouvelles tentatives. Avec un ``cache`` (:class:`PageCache`),
+    les pages inchangées depuis une conversion précédente sont réutilisées.
+    Avec ``ocr`` (langue Tesseract, ``"fra"``), chaque page reçoit une couche
+    de texte invisible (voir :mod:`ocr`). Avec ``drop_similar``, les doublons
+    et quasi-doublons sont ignorés (voir :mod:`dedup`). ``metrics`` reçoit
+    les mesures de chaque page puis du document (voir :mod:`metrics`). Si
+    ``cancel_event`` (:class:`threading.Event`) est levé, la conversion
+    s'arrête avant la page suivante en levant :class:`ConversionCancelled`.
+    Avec ``previous`` (:class:`PdfState`), les pages sont ajoutées au
+    document existant par mise à jour incrémentale (voir :func:`append_pdf`).
+    Renvoie le nombre de pages écrites.
+    """
+    started = time.perf_counter()
+    if metrics is not None:
+        metrics = PeakMemory(metrics)
+    pages = expand_pages(sources)
+    total = len(pages)
+    skipped = 0
+    writer = StreamingPdfWriter(fp, previous=previous)
+    existing_pages = writer.page_count
+    existing_bytes = writer.bytes_written
+    prepared = iter_prepared_pages(pages, max_dimension=max_dimension, quality=quality,
+                                   jpeg_passthrough=jpeg_passthrough, workers=workers,
+                                   use_processes=use_processes, retries=retries, cache=cache,
+                                   compression=compression, auto_levels=auto_levels, ocr=ocr,
+                                   drop_similar=drop_similar)
+
+    try:
+        for idx, (page, payload, page_metrics, error) in enumerate(prepared):
+            if cancel_event is not None and cancel_event.is_set():
+                raise ConversionCancelled("Conversion annulée")
+
+            name = page_name(page)
+            if on_progress:
+                on_progress(idx, total, name)
+
+            if error is not None:
+                skipped += 1
+                if on_error:
+                    on_error(name, error)
+                continue
+
+            with page_metrics.stage("ecriture"):
+                writer.add_page(payload)
+            if metrics is not None:
+                metrics.record_page(page_metrics)
+    finally:
+        # Arrête immédiatement les processus de conversion en cas d'interruption
+        prepared.close()
+
+    page_count = writer.page_count - existing_pages
+    if page_count == 0:
+        raise ValueError("Aucune image valide n'a pu être traitée")
+
+    writer.close()
+    if cache is not None:
+        cache.evict()
+    if metrics is not None:
+        metrics.record_document(DocumentMetrics(
+            pages=page_count,
+            skipped=skipped,
+            seconds=time.perf_counter() - started,
+            bytes_out=writer.bytes_written - existing_bytes,
+            peak_rss_mb=metrics.peak_rss_mb,
+        ))
+    return page_count
+
+
+def write_pdf_to_file(sources, path, **options):
+    """Écrit le PDF directement sur disque.
+
+    Le document est construit dans ``<path>.part`` puis renommé une fois
+    complet ; le fichier partiel est supprimé en cas d'échec. Les options
+    sont celles de :func:`write_pdf`.
+    """
+    partial_path = path + ".part"
+    try:
+        with open(partial_path, "wb") as f:
+            page_count = write_pdf(sources, f, **options)
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return page_count
+
+
+def append_pdf(sources, path, **options):
+    """Ajoute les pages des sources à la fin d'un PDF produit par cet outil.
+
+    Mise à jour incrémentale : les nouvelles pages, l'arbre des pages et une
+    table xref sont ajoutés en fin de fichier ; les pages existantes ne sont
+    ni relues ni recompressées. En cas d'échec, le fichier est ramené à sa
+    taille d'origine. Les options sont celles de :func:`write_pdf`. Renvoie
+    le nombre de pages ajoutées.
+    """
+    with open(path, "r+b") as f:
+        previous = read_pdf_state(f)
+        f.seek(previous.length)
+        try:
+            return write_pdf(sources, f, previous=previous, **options)
+        except BaseException:
+            f.truncate(previous.length)
+            raise
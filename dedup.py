@@ -0,0 +1,129 @@
+"""Pages en double dans une sélection : contenu identique ou quasi identique.
+
+- doublons exacts (copie « (1) », même photo uploadée deux fois) : repérés
+  par l'empreinte SHA-256 du contenu, calculée au fil de la préparation et
+  seulement pour les fichiers de même taille. Un doublon proche de la page
+  précédente identique en reprend le résultat, et son image n'est écrite
+  qu'une fois dans le PDF (XObject partagé, voir :mod:`pdf_writer`) ;
+- quasi-doublons (réexport, recompression, copie redimensionnée) : empreinte
+  perceptuelle (dHash) de la page préparée. Les écarter est une option :
+  deux pages différentes mais de même mise en page peuvent se ressembler.
+  L'empreinte n'est calculée qu'avec cette option.
+"""
+import os
+from collections import Counter
+
+from PIL import Image
+
+from page_cache import content_hash
+
+# dHash sur une vignette de HASH_SIZE × HASH_SIZE comparaisons (256 bits)
+HASH_SIZE = 16
+# Nombre maximal de bits différents entre deux quasi-doublons
+SIMILAR_DISTANCE = 10
+# En deçà de cet écart de niveaux, la vignette est uniforme (page blanche) :
+# son empreinte ne distinguerait pas deux pages vides de contenus différents
+MIN_CONTRAST = 8
+# Empreinte d'une image uniforme, jamais rapprochée d'une autre
+UNIFORM = -1
+
+
+class DuplicatePage(Exception):
+    """Page écartée comme quasi-doublon d'une page précédente"""
+
+
+class DuplicateFinder:
+    """Doublons exacts parmi les pages (:class:`PageRef`), repérés au fil de
+    la préparation.
+
+    Les tailles des fichiers sont relevées d'emblée ; l'empreinte d'un
+    fichier n'est calculée qu'au moment où sa page est examinée, et seulement
+    si un autre fichier a la même taille. Elle est transmise au cache de
+    pages, qui n'a pas à relire le fichier.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self._sizes = {}
+        self._identities = {}
+        self._counts = Counter()
+        for page in pages:
+            identity = os.path.abspath(page.source)
+            if identity not in self._sizes:
+                try:
+                    self._sizes[identity] = os.path.getsize(page.source)
+                except OSError:
+                    continue  # Fichier illisible : l'erreur sera signalée à la préparation
+                self._identities.setdefault(self._sizes[identity], set()).add(identity)
+            self._counts[self._sizes[identity], page.frame] += 1
+        self._digests = {}
+        self._latest = {}
+
+    def can_repeat(self, index):
+        """Vrai si une autre page a la même taille : la page peut avoir un doublon"""
+        page = self.pages[index]
+        size = self._sizes.get(os.path.abspath(page.source))
+        return size is not None and self._counts[size, page.frame] > 1
+
+    def digest(self, source):
+        """Empreinte du contenu de ``source`` si elle a été calculée, sinon None"""
+        return self._digests.get(os.path.abspath(source))
+
+    def previous(self, index):
+        """Indice de la dernière page identique à la page ``index`` parmi les
+        pages déjà examinées, ou None. Les pages sont examinées dans l'ordre.
+        """
+        if not self.can_repeat(index):
+            return None
+        page = self.pages[index]
+        identity = os.path.abspath(page.source)
+        key = identity
+        if len(self._identities[self._sizes[identity]]) > 1:
+            if identity not in self._digests:
+                try:
+                    self._digests[identity] = content_hash(page.source)
+                except OSError:
+                    return None
+            key = self._digests[identity]
+        previous = self._latest.get((key, page.frame))
+        self._latest[key, page.frame] = index
+        return previous
+
+
+def perceptual_hash(img):
+    """dHash de l'image : signe des différences horizontales entre pixels
+    voisins d'une vignette en niveaux de gris, sous forme d'entier.
+
+    UNIFORM pour une image uniforme, qui n'est jamais écartée comme quasi-doublon.
+    """
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("L")
+    thumb = img.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX).convert("L")
+    low, high = thumb.getextrema()
+    if high - low < MIN_CONTRAST:
+        return UNIFORM
+    pixels = list(thumb.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        line = pixels[row * (HASH_SIZE + 1):(row + 1) * (HASH_SIZE + 1)]
+        for left, right in zip(line, line[1:]):
+            value = (value << 1) | (left > right)
+    return value
+
+
+class SimilarPages:
+    """Mémoire des empreintes des pages conservées, pour écarter les quasi-doublons"""
+
+    def __init__(self, max_distance=SIMILAR_DISTANCE):
+        self.max_distance = max_distance
+        self._kept = []
+
+    def check(self, name, fingerprint):
+        """Lève :class:`DuplicatePage` si la page ressemble à une page déjà
+        conservée, sinon la retient"""
+        if fingerprint is None or fingerprint == UNIFORM:
+            return
+        for kept_name, kept in self._kept:
+            if (fingerprint ^ kept).bit_count() <= self.max_distance:
+                raise DuplicatePage(f"doublon de {kept_name}")
+        self._kept.append((name, fingerprint))
@@ -0,0 +1,141 @@
+"""Choix de la compression de chaque page selon son contenu.
+
+- pages noir et blanc (scans de plans, dessins au trait) : CCITT G4, sans perte ;
+- pages à peu de niveaux de gris ou de couleurs (exports de plans, PNG
+  vectoriels) : Flate, en niveaux de gris ou en couleurs indexées ;
+- photographies et scans en niveaux de gris : JPEG en DeviceGray ;
+- le reste : JPEG RGB, comme auparavant.
+
+Les pages compressées sans perte ne sont pas rééchantillonnées : elles
+gardent leur définition d'origine (aucun trait fin n'est estompé) et sont
+simplement affichées à la taille de page réduite.
+"""
+import io
+import zlib
+
+from PIL import Image, TiffImagePlugin
+
+from pdf_writer import ImagePayload
+
+COMPRESSION_MODES = ["auto", "jpeg"]
+
+# Au-delà de ce nombre de couleurs (ou de niveaux de gris), la page est
+# considérée comme photographique et compressée en JPEG
+MAX_LOSSLESS_COLORS = 64
+
+# Formats sources déjà compressés avec perte : les analyser n'apporte rien
+LOSSY_FORMATS = {"JPEG", "MPO", "WEBP"}
+
+
+# -------------------------------------------------
+# ENCODEURS
+# -------------------------------------------------
+def encode_jpeg(img, quality):
+    """JPEG en DeviceGray pour une image L, en DeviceRGB sinon"""
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return ImagePayload(
+        data=buffer.getvalue(),
+        width=img.size[0],
+        height=img.size[1],
+        color_space="DeviceGray" if img.mode == "L" else "DeviceRGB",
+    )
+
+
+def encode_bilevel(img):
+    """CCITT groupe 4 d'une image noir et blanc (mode 1)"""
+    width, height = img.size
+    buffer = io.BytesIO()
+    # Une seule bande : le flux G4 est contigu dans le fichier TIFF
+    img.save(buffer, format="TIFF", compression="group4", strip_size=(width + 7) // 8 * height)
+
+    buffer.seek(0)
+    with Image.open(buffer) as tiff:
+        offset = tiff.tag_v2[TiffImagePlugin.STRIPOFFSETS][0]
+        length = tiff.tag_v2[TiffImagePlugin.STRIPBYTECOUNTS][0]
+        # libtiff code les bits à 1 comme des plages « noires » : avec
+        # MinIsBlack (1), ce sont les pixels blancs de l'image
+        photometric = tiff.tag_v2.get(TiffImagePlugin.PHOTOMETRIC_INTERPRETATION, 0)
+
+    return ImagePayload(
+        data=buffer.getvalue()[offset:offset + length],
+        width=width,
+        height=height,
+        filter="CCITTFaxDecode",
+        color_space="DeviceGray",
+        bits_per_component=1,
+        decode_parms={"K": -1, "Columns": width, "Rows": height, "BlackIs1": photometric == 1},
+    )
+
+
+def encode_flate(img):
+    """Flate sans perte d'une image L (DeviceGray) ou P (couleurs indexées)"""
+    width, height = img.size
+    data = zlib.compress(img.tobytes(), 6)
+
+    if img.mode == "P":
+        return ImagePayload(
+            data=data,
+            width=width,
+            height=height,
+            filter="FlateDecode",
+            color_space="DeviceRGB",
+            palette=bytes(img.getpalette("RGB")),
+        )
+
+    return ImagePayload(data=data, width=width, height=height, filter="FlateDecode",
+                        color_space="DeviceGray")
+
+
+# -------------------------------------------------
+# SÉLECTION AUTOMATIQUE
+# -------------------------------------------------
+def _is_bilevel(colors):
+    return {color for _, color in colors} <= {0, 255}
+
+
+def classify(img, source_format=None):
+    """Prépare l'image pour l'encodeur le plus adapté.
+
+    Renvoie ``(type, image)`` avec type parmi ``bilevel``, ``gray``,
+    ``palette`` (compression sans perte) ou ``jpeg``.
+    """
+    if img.mode == "1":
+        return "bilevel", img
+
+    if source_format in LOSSY_FORMATS:
+        return "jpeg", img
+
+    if img.mode == "P" and "transparency" not in img.info:
+        img = img.convert("RGB")
+    elif img.mode not in ("L", "RGB"):
+        return "jpeg", img
+
+    colors = img.getcolors(MAX_LOSSLESS_COLORS)
+    if colors is None:
+        return "jpeg", img
+
+    if img.mode == "RGB":
+        if all(r == g == b for _, (r, g, b) in colors):
+            img = img.convert("L")
+            colors = [(count, color[0]) for count, color in colors]
+        else:
+            palette = Image.new("P", (1, 1))
+            flat = [channel for _, color in colors for channel in color]
+            palette.putpalette(flat)
+            return "palette", img.quantize(palette=palette, dither=Image.Dither.NONE)
+
+    if _is_bilevel(colors):
+        return "bilevel", img.point(lambda v: 255 if v >= 128 else 0, mode="1")
+    return "gray", img
+
+
+def encode_image(kind, img, quality):
+    """Encode une image préparée par :func:`classify`"""
+    if kind == "bilevel":
+        return encode_bilevel(img)
+    if kind in ("gray", "palette"):
+        return encode_flate(img)
+    return encode_jpeg(img, quality)
@@ -0,0 +1,98 @@
+"""Index d'un dossier d'images : un instantané ``os.scandir`` réutilisable.
+
+L'index conserve, pour chaque image, la date de création, la taille et la
+clé de tri naturel. Il n'est relu que si la date de modification du dossier
+change, et seules les entrées nouvelles ou modifiées sont recalculées ; tous
+les modes de tri sont servis depuis cet instantané.
+"""
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from conversion import ALLOWED_EXTENSIONS, natural_sort_key
+from probe import capture_date
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    """Métadonnées d'une image du dossier"""
+    name: str
+    ctime: float
+    mtime_ns: int
+    size: int
+    name_key: tuple
+    suffix: str
+
+
+class FolderIndex:
+    """Liste triée des images d'un dossier, rafraîchie de façon incrémentale"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._dir_mtime_ns = None
+        self._entries = {}
+        self._sorted = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        self.refresh()
+        return len(self._entries)
+
+    def refresh(self):
+        """Relit le dossier si sa date de modification a changé"""
+        dir_mtime_ns = os.stat(self.folder).st_mtime_ns
+        with self._lock:
+            if dir_mtime_ns == self._dir_mtime_ns:
+                return False
+
+            entries = {}
+            with os.scandir(self.folder) as it:
+                for item in it:
+                    suffix = Path(item.name).suffix.lower()
+                    if suffix not in ALLOWED_EXTENSIONS or not item.is_file():
+                        continue
+                    stat = item.stat()
+                    previous = self._entries.get(item.name)
+                    if previous and previous.mtime_ns == stat.st_mtime_ns and previous.size == stat.st_size:
+                        entries[item.name] = previous
+                    else:
+                        entries[item.name] = IndexEntry(
+                            name=item.name,
+                            ctime=stat.st_ctime,
+                            mtime_ns=stat.st_mtime_ns,
+                            size=stat.st_size,
+                            name_key=tuple(natural_sort_key(item.name)),
+                            suffix=suffix,
+                        )
+
+            self._entries = entries
+            self._sorted = {}
+            self._dir_mtime_ns = dir_mtime_ns
+            return True
+
+    def entry(self, name):
+        return self._entries.get(name)
+
+    def sorted_names(self, sort_by="nom", reverse=False):
+        """Noms des images triés selon ``sort_by`` (mêmes modes que sort_images)"""
+        self.refresh()
+        with self._lock:
+            names = self._sorted.get(sort_by)
+            if names is None:
+                by_name = sorted(self._entries.values(), key=lambda e: e.name_key)
+                if sort_by == "date_creation":
+                    ordered = sorted(by_name, key=lambda e: e.ctime)
+                elif sort_by == "date_prise_vue":
+                    # En-têtes EXIF lus à la demande, mémorisés par fichier
+                    ordered = sorted(by_name, key=lambda e: capture_date(os.path.join(self.folder, e.name)))
+                elif sort_by == "taille":
+                    ordered = sorted(by_name, key=lambda e: e.size)
+                elif sort_by == "type":
+                    ordered = sorted(by_name, key=lambda e: e.suffix)
+                else:
+                    ordered = by_name
+                names = [e.name for e in ordered]
+                self._sorted[sort_by] = names
+
+        return list(reversed(names)) if reverse else list(names)
@@ -0,0 +1,314 @@
+"""Conversions en arrière-plan, indépendantes des reruns Streamlit.
+
+Chaque conversion soumise reçoit un identifiant : son avancement, son
+résultat (PDF et mesures) ou son erreur restent consultables après un
+rerun ou un rafraîchissement de la page, jusqu'à ce que la tâche soit
+retirée ou expire. Une tâche peut être annulée : la conversion s'arrête
+avant la page suivante et le fichier partiel est supprimé.
+
+Le gestionnaire est partagé par toutes les sessions du serveur. Une tâche
+n'est démarrée que si le nombre de conversions, de processus et la mémoire
+estimée (d'après le volume en pixels des pages traitées simultanément)
+restent dans les limites ; la file est servie à tour de rôle entre les
+sessions pour qu'un gros lot n'en bloque pas d'autres. La mémoire d'une
+tâche n'est estimée qu'au moment de son admission : soumettre un lot de
+nombreux dossiers ne sonde aucune image.
+"""
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+from batch import STATUS_DONE, STATUS_FAILED, STATUS_PENDING, STATUS_RUNNING
+from conversion import ConversionCancelled, DEFAULT_WORKERS, append_pdf, write_pdf_to_file
+from metrics import StatsCollector
+from probe import probe_image
+from splitting import write_pdf_parts, write_pdf_zip
+
+STATUS_CANCELLED = "annule"
+
+# Conversions simultanées, processus de conversion et mémoire pour tout le serveur
+DEFAULT_MAX_JOBS = 2
+DEFAULT_MAX_WORKERS = os.cpu_count() or 1
+DEFAULT_MEMORY_BUDGET = 2 * 1024 * 1024 * 1024
+# Mémoire d'une page en cours : image décodée et copie convertie (RGB)
+PAGE_BYTES_PER_PIXEL = 6
+# Durée de conservation d'une tâche terminée et de son PDF temporaire (s)
+DEFAULT_RESULT_TTL = 3600
+
+
+@dataclass
+class ConversionJob:
+    """Conversion soumise en arrière-plan"""
+    id: str
+    name: str
+    output_path: str
+    keep_output: bool = False
+    owner: str = ""
+    sequence: int = 0
+    estimated_bytes: int = None
+    max_pages: int = None
+    max_bytes: int = None
+    append: bool = False
+    sources: list = field(default_factory=list, repr=False)
+    options: dict = field(default_factory=dict)
+    status: str = STATUS_PENDING
+    done: int = 0
+    total: int = 0
+    current: str = ""
+    page_count: int = 0
+    parts: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    error: str = ""
+    saved_to: str = ""
+    metrics: StatsCollector = field(default_factory=StatsCollector, repr=False)
+    finished_at: float = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def active(self):
+        return self.status in (STATUS_PENDING, STATUS_RUNNING)
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 0.0
+
+    @property
+    def split(self):
+        """Conversion découpée en plusieurs PDF (ZIP à télécharger, ou parties sur disque)"""
+        return bool(self.max_pages or self.max_bytes)
+
+    @property
+    def workers(self):
+        return self.options.get("workers", DEFAULT_WORKERS)
+
+
+def estimate_job_bytes(sources, workers=DEFAULT_WORKERS):
+    """Mémoire estimée d'une conversion : les plus grandes pages pouvant être
+    en cours simultanément (``2 × workers``), à PAGE_BYTES_PER_PIXEL octets par pixel"""
+    in_flight = max(1, 2 * workers)
+    largest = sorted((probe_image(source).pixels for source in sources), reverse=True)[:in_flight]
+    return sum(largest) * PAGE_BYTES_PER_PIXEL
+
+
+class JobManager:
+    """Ordonnanceur des conversions du serveur, avec contrôle d'admission.
+
+    ``submit`` rend la main immédiatement ; l'appelant conserve l'identifiant
+    de la tâche et interroge :meth:`get` (et :meth:`queue_position` tant
+    qu'elle attend) pour suivre son avancement. Une tâche seule est toujours
+    admise, même si elle dépasse le budget mémoire.
+    """
+
+    def __init__(self, max_jobs=DEFAULT_MAX_JOBS, max_workers=DEFAULT_MAX_WORKERS,
+                 memory_budget=DEFAULT_MEMORY_BUDGET, result_ttl=DEFAULT_RESULT_TTL):
+        self.max_jobs = max_jobs
+        self.max_workers = max_workers
+        self.memory_budget = memory_budget
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._pending = []
+        self._running = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def submit(self, sources, output_path=None, name="document.pdf", owner="", max_pages=None,
+               max_bytes=None, append=False, **options):
+        """Place la conversion de ``sources`` dans la file.
+
+        Sans ``output_path``, le PDF est écrit dans un fichier temporaire
+        supprimé avec la tâche. Avec ``max_pages`` ou ``max_bytes``, le PDF
+        est découpé en parties (voir :mod:`splitting`) : écrites à côté de
+        ``output_path``, ou réunies dans une archive ZIP temporaire.
+        Avec ``append``, les pages sont ajoutées à la fin du PDF existant
+        ``output_path`` (voir :func:`append_pdf`), sans découpage possible.
+        ``owner`` identifie la session pour le partage équitable de la file.
+        Les options sont celles de :func:`write_pdf` ; ``workers`` est
+        limité à ``max_workers``.
+        """
+        if append and (output_path is None or max_pages or max_bytes):
+            raise ValueError("L'ajout à un PDF existant demande un fichier de sortie, sans découpage")
+        self.purge()
+        keep_output = output_path is not None
+        if not keep_output:
+            suffix = ".zip" if max_pages or max_bytes else ".pdf"
+            fd, output_path = tempfile.mkstemp(prefix="ogef_", suffix=suffix)
+            os.close(fd)
+
+        sources = list(sources)
+        options["workers"] = max(1, min(options.get("workers", DEFAULT_WORKERS), self.max_workers))
+        job = ConversionJob(id=uuid.uuid4().hex[:12], name=name, output_path=output_path,
+                            keep_output=keep_output, owner=owner, sources=sources, options=options,
+                            max_pages=max_pages, max_bytes=max_bytes, append=append)
+        with self._lock:
+            job.sequence = next(self._sequence)
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._dispatch()
+        return job
+
+    # ----- ORDONNANCEMENT -----
+    def _fair_order(self):
+        """Tâches en attente dans leur ordre de démarrage : à tour de rôle
+        entre les sessions, la moins servie (tâches en cours) d'abord"""
+        queues = {}
+        for job in self._pending:
+            queues.setdefault(job.owner, deque()).append(job)
+        served = Counter(job.owner for job in self._running)
+
+        order = []
+        while queues:
+            # À égalité, la session dont la tâche attend depuis le plus longtemps
+            owner = min(queues, key=lambda o: (served[o], queues[o][0].sequence))
+            order.append(queues[owner].popleft())
+            served[owner] += 1
+            if not queues[owner]:
+                del queues[owner]
+        return order
+
+    def _admits(self, job):
+        if not self._running:
+            return True
+        return (len(self._running) < self.max_jobs
+                and sum(j.workers for j in self._running) + job.workers <= self.max_workers
+                and sum(j.estimated_bytes for j in self._running) + job.estimated_bytes
+                <= self.memory_budget)
+
+    def _dispatch(self):
+        """Démarre les tâches admissibles (appelé avec le verrou)"""
+        # Toutes les places prises : inutile de classer la file
+        while self._pending and len(self._running) < self.max_jobs:
+            job = self._fair_order()[0]
+            if job.estimated_bytes is None:
+                job.estimated_bytes = estimate_job_bytes(job.sources, job.workers)
+            # Pas de dépassement : la tâche suivante attend que la place se libère
+            if not self._admits(job):
+                break
+            self._pending.remove(job)
+            self._running.append(job)
+            job.status = STATUS_RUNNING
+            threading.Thread(target=self._run, args=(job,), name=f"conversion-{job.id}",
+                             daemon=True).start()
+
+    def queue_positions(self):
+        """Rangs (à partir de 1) des tâches en attente, par identifiant"""
+        with self._lock:
+            return {job.id: position for position, job in enumerate(self._fair_order(), start=1)}
+
+    def queue_position(self, job_id):
+        """Rang (à partir de 1) d'une tâche en attente, 0 si elle n'attend pas"""
+        return self.queue_positions().get(job_id, 0)
+
+    def load(self):
+        """Occupation du serveur : tâches en cours, en attente et mémoire réservée"""
+        with self._lock:
+            return {
+                "running": len(self._running),
+                "pending": len(self._pending),
+                "reserved_bytes": sum(job.estimated_bytes for job in self._running),
+            }
+
+    # ----- EXÉCUTION -----
+    def _run(self, job):
+        def on_progress(idx, total, name):
+            job.done, job.total, job.current = idx, total, name
+
+        options = dict(
+            job.options,
+            metrics=job.metrics,
+            on_progress=on_progress,
+            on_error=lambda name, error: job.skipped.append(f"{name} - {error}"),
+            cancel_event=job.cancel_event,
+        )
+        limits = dict(max_pages=job.max_pages, max_bytes=job.max_bytes)
+        try:
+            if job.append:
+                job.page_count = append_pdf(job.sources, job.output_path, **options)
+            elif not job.split:
+                job.page_count = write_pdf_to_file(job.sources, job.output_path, **options)
+            else:
+                if job.keep_output:
+                    job.parts = write_pdf_parts(job.sources, os.path.dirname(job.output_path),
+                                                os.path.basename(job.output_path), **limits, **options)
+                else:
+                    job.parts = write_pdf_zip(job.sources, job.output_path, job.name, **limits, **options)
+                job.page_count = sum(count for _, count in job.parts)
+            job.done = job.total
+            self._finish(job, STATUS_DONE)
+        except ConversionCancelled:
+            self._finish(job, STATUS_CANCELLED)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, STATUS_FAILED)
+        finally:
+            with self._lock:
+                self._running.remove(job)
+                self._dispatch()
+
+    def _finish(self, job, status):
+        # La liste des sources n'est plus utile
+        job.sources = []
+        if status != STATUS_DONE:
+            self._remove_output(job)
+        job.finished_at = time.time()
+        job.status = status
+
+    @staticmethod
+    def _remove_output(job):
+        if not job.keep_output and not job.saved_to and os.path.exists(job.output_path):
+            os.remove(job.output_path)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Retire une tâche de la file, ou demande l'arrêt d'une tâche en cours"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.active:
+                return
+            job.cancel_event.set()
+            if job not in self._pending:
+                return
+            self._pending.remove(job)
+            self._dispatch()
+        self._finish(job, STATUS_CANCELLED)
+
+    def save_output(self, job_id, path):
+        """Déplace le résultat temporaire d'une tâche terminée vers ``path`` :
+        il n'est plus supprimé avec la tâche"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != STATUS_DONE or job.keep_output or job.saved_to:
+                raise ValueError("Aucun résultat temporaire à enregistrer")
+            # Réservé avant le déplacement : la purge ne supprime plus le fichier
+            job.saved_to = path
+        try:
+            shutil.move(job.output_path, path)
+        except OSError:
+            job.saved_to = ""
+            raise
+
+    def discard(self, job_id):
+        """Retire une tâche terminée et supprime son PDF temporaire"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.active:
+                return
+            del self._jobs[job_id]
+        self._remove_output(job)
+
+    def purge(self):
+        """Retire les tâches terminées depuis plus de ``result_ttl`` secondes"""
+        limit = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job.id for job in self._jobs.values()
+                       if not job.active and job.finished_at < limit]
+        for job_id in expired:
+            self.discard(job_id)
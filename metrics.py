@@ -0,0 +1,169 @@
+"""Mesures de la conversion : durée par étape, volumes et mémoire.
+
+Chaque page produit un :class:`PageMetrics` (ouverture, décodage, analyse,
+conversion, réduction, OCR, compression, écriture) et chaque document un
+:class:`DocumentMetrics`. Ils sont transmis à un collecteur interchangeable :
+:class:`StatsCollector` pour des statistiques en mémoire, :class:`JsonLinesSink`
+pour un journal JSON.
+"""
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Étapes dans l'ordre du pipeline
+STAGES = ["cache", "ouverture", "decodage", "analyse", "conversion", "reduction", "ocr", "compression",
+          "ecriture"]
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus courant depuis son démarrage, en
+    Mo, si mesurable"""
+    if resource is not None:
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    return None
+
+
+@dataclass
+class PageMetrics:
+    """Mesures d'une page.
+
+    ``peak_rss_mb`` est le pic mémoire du processus de conversion qui a
+    préparé la page ; None si elle l'a été dans le processus appelant, dont
+    le pic couvre toute sa durée de vie (serveur Streamlit).
+    """
+    name: str = ""
+    stages: dict = field(default_factory=dict)
+    bytes_in: int = 0
+    bytes_out: int = 0
+    pixels_in: int = 0
+    pixels_out: int = 0
+    cached: bool = False
+    passthrough: bool = False
+    duplicate: bool = False
+    words: int = 0
+    peak_rss_mb: float = None
+
+    @contextmanager
+    def stage(self, name):
+        """Chronomètre une étape (les durées d'une même étape s'additionnent)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+@dataclass
+class DocumentMetrics:
+    """Mesures d'un document complet.
+
+    ``peak_rss_mb`` est le plus haut pic mémoire des processus de conversion
+    (voir :class:`PeakMemory`), None sans processus dédiés.
+    """
+    pages: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    bytes_out: int = 0
+    peak_rss_mb: float = None
+
+
+# -------------------------------------------------
+# COLLECTEURS
+# -------------------------------------------------
+class StatsCollector:
+    """Collecteur en mémoire : conserve les pages et agrège par étape"""
+
+    def __init__(self):
+        self.pages = []
+        self.document = None
+        self._lock = threading.Lock()
+
+    def record_page(self, page):
+        with self._lock:
+            self.pages.append(page)
+
+    def record_document(self, document):
+        self.document = document
+
+    def stage_totals(self):
+        """Durée cumulée (s) par étape, dans l'ordre du pipeline"""
+        totals = {}
+        for page in self.pages:
+            for name, seconds in page.stages.items():
+                totals[name] = totals.get(name, 0.0) + seconds
+        return {name: totals[name] for name in STAGES if name in totals}
+
+    def summary(self):
+        """Agrégats du document : volumes, pixels, pages en cache, copiées telles
+        quelles ou identiques à une page précédente, mots reconnus par OCR"""
+        return {
+            "pages": len(self.pages),
+            "bytes_in": sum(p.bytes_in for p in self.pages),
+            "bytes_out": sum(p.bytes_out for p in self.pages),
+            "pixels_in": sum(p.pixels_in for p in self.pages),
+            "pixels_out": sum(p.pixels_out for p in self.pages),
+            "cached": sum(p.cached for p in self.pages),
+            "passthrough": sum(p.passthrough for p in self.pages),
+            "duplicates": sum(p.duplicate for p in self.pages),
+            "words": sum(p.words for p in self.pages),
+            "stages": self.stage_totals(),
+            "document": asdict(self.document) if self.document else None,
+        }
+
+
+class PeakMemory:
+    """Transmet les mesures à ``metrics`` en retenant le plus haut pic
+    mémoire relevé pour les pages"""
+
+    def __init__(self, metrics):
+        self._metrics = metrics
+        self.peak_rss_mb = None
+        self._lock = threading.Lock()
+
+    def record_page(self, page):
+        if page.peak_rss_mb is not None:
+            with self._lock:
+                self.peak_rss_mb = max(self.peak_rss_mb or 0.0, page.peak_rss_mb)
+        self._metrics.record_page(page)
+
+    def record_document(self, document):
+        self._metrics.record_document(document)
+
+
+class JsonLinesSink:
+    """Collecteur écrivant une ligne JSON par page puis une pour le document"""
+
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def _write(self, kind, record):
+        with self._lock:
+            self._file.write(json.dumps(dict(type=kind, **asdict(record)), ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def record_page(self, page):
+        self._write("page", page)
+
+    def record_document(self, document):
+        self._write("document", document)
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,134 @@
+"""Normalisation des pixels avant compression, vectorisée avec NumPy.
+
+Remplace ``Image.convert("RGB")`` pour les modes qu'il traite lentement ou
+mal :
+
+- 16 bits (TIFF, PNG) : ramenés sur 8 bits sans écrêtage (``convert`` sature
+  toutes les valeurs au-delà de 255) ;
+- transparence (RGBA, LA, P avec couleur transparente) : composée sur fond
+  blanc, et non plus sur la couleur (souvent noire) des pixels transparents ;
+- CMYK : converti en RGB ;
+- niveaux automatiques (optionnels) : l'histogramme est étiré entre les
+  centiles AUTO_LEVELS_CLIP et 100 - AUTO_LEVELS_CLIP, par une table de
+  correspondance appliquée à toute l'image.
+
+Les images L, RGB et noir et blanc (1) passent sans copie.
+"""
+import numpy as np
+from PIL import Image
+
+# Part des pixels (%) ignorée à chaque extrémité de l'histogramme
+AUTO_LEVELS_CLIP = 0.5
+# Sous-échantillonnage pour le calcul des centiles
+_LEVELS_STEP = 4
+
+_HIGH_DEPTH_MODES = {"I;16", "I;16L", "I;16B", "I;16N", "I", "F"}
+
+
+def _div255(values):
+    """Division entière arrondie par 255 d'un tableau uint16, sans division"""
+    values += 128
+    values += values >> 8
+    values >>= 8
+    return values.astype(np.uint8)
+
+
+def _to_8bit(values):
+    """Valeurs 16 bits (ou entières, flottantes) ramenées sur 0-255.
+
+    Les entiers sont lus sur 16 bits quelle que soit la plage présente, pour
+    que les bandes d'une même image (voir :mod:`strips`) restent cohérentes.
+    """
+    if values.dtype.kind == "f":
+        values = values * 255 if values.max(initial=0) <= 1 else values
+        return np.clip(values + 0.5, 0, 255).astype(np.uint8)
+    if values.dtype != np.uint16:
+        values = values.clip(0, 65535)
+    return (values >> 8).astype(np.uint8)
+
+
+def _on_white(color, alpha):
+    """Compose des couleurs 8 bits sur fond blanc selon ``alpha`` :
+    ``couleur × alpha + 255 × (255 - alpha)``, divisé par 255"""
+    if color.ndim == 3:
+        alpha = alpha[..., None]
+    # Forme équivalente : blanc - (255 - couleur) × alpha / 255
+    values = np.subtract(255, color, dtype=np.uint16)
+    values *= alpha
+    values = _div255(values)
+    return np.subtract(255, values, out=values)
+
+
+def _palette_to_rgb(img):
+    indices = np.asarray(img)
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    colors = np.asarray(img.getpalette("RGB") or [], dtype=np.uint8).reshape(-1, 3)[:256]
+    palette[:len(colors)] = colors
+    rgb = palette[indices]
+
+    transparency = img.info.get("transparency")
+    if transparency is None:
+        return rgb
+    alpha = np.full(256, 255, dtype=np.uint8)
+    if isinstance(transparency, bytes):
+        alpha[:len(transparency)] = np.frombuffer(transparency[:256], dtype=np.uint8)
+    else:
+        alpha[transparency] = 0
+    return _on_white(rgb, alpha[indices])
+
+
+def _cmyk_to_rgb(values):
+    rgb = np.subtract(255, values[..., :3], dtype=np.uint16)
+    rgb *= 255 - values[..., 3:]
+    return _div255(rgb)
+
+
+def auto_levels(values):
+    """Étire l'histogramme de ``values`` (tableau 8 bits L ou RGB) sur 0-255"""
+    sample = values[::_LEVELS_STEP, ::_LEVELS_STEP]
+    if sample.ndim == 3:
+        sample = sample.mean(axis=2)
+    low, high = np.percentile(sample, [AUTO_LEVELS_CLIP, 100 - AUTO_LEVELS_CLIP])
+    if high - low < 1 or (low <= 0 and high >= 255):
+        return values
+    table = np.clip((np.arange(256) - low) * 255 / (high - low) + 0.5, 0, 255).astype(np.uint8)
+    return table[values]
+
+
+def to_array(img):
+    """Tableau 8 bits (hauteur × largeur, ou × 3 en couleur) des pixels de l'image"""
+    mode = img.mode
+    if mode in ("L", "RGB"):
+        return np.asarray(img)
+    if mode == "1":
+        return np.asarray(img).astype(np.uint8) * 255
+    if mode in _HIGH_DEPTH_MODES:
+        return _to_8bit(np.asarray(img))
+    if mode in ("RGBA", "LA"):
+        values = np.asarray(img)
+        color = values[..., 0] if mode == "LA" else values[..., :3]
+        return _on_white(color, values[..., -1])
+    if mode == "P":
+        return _palette_to_rgb(img)
+    if mode == "CMYK":
+        return _cmyk_to_rgb(np.asarray(img))
+    # YCbCr, LAB, HSV, PA... : conversion Pillow, puis transparence éventuelle
+    return to_array(img.convert("RGBA" if "A" in mode else "RGB"))
+
+
+def normalize(img, mode=None, levels=False):
+    """Image 8 bits prête pour la compression : L, RGB, ou 1 conservée.
+
+    ``mode`` (``L`` ou ``RGB``) impose le mode de sortie ; ``levels`` active
+    les niveaux automatiques.
+    """
+    if img.mode == "1" and mode is None:
+        return img
+    if img.mode in ("L", "RGB") and mode in (None, img.mode) and not levels:
+        return img
+
+    values = to_array(img)
+    if levels:
+        values = auto_levels(values)
+    img = Image.fromarray(values)
+    return img.convert(mode) if mode and img.mode != mode else img
@@ -0,0 +1,92 @@
+"""Reconnaissance de texte (OCR) pour des PDF cherchables.
+
+Moteur local : Tesseract, via pytesseract. Les deux sont optionnels : sans
+eux, l'option OCR est indisponible et le reste de la conversion inchangé.
+
+La reconnaissance porte sur la page préparée (décodée et redimensionnée),
+dans le processus qui prépare la page : les pages sont reconnues en
+parallèle par le pool de :func:`iter_prepared_pages`. Les mots reconnus
+(texte et boîte en pixels de l'image) sont écrits comme texte invisible
+au-dessus de l'image (voir :mod:`pdf_writer`).
+
+La reconnaissance est l'étape la plus lente de la conversion : ses résultats
+sont conservés dans le cache de pages (:class:`PageCache`), adressés par
+l'empreinte des pixels analysés et la langue. Une page dont seuls les
+réglages de compression changent n'est pas reconnue à nouveau.
+"""
+import hashlib
+from functools import lru_cache
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+# Langue(s) Tesseract par défaut (plusieurs : "fra+eng")
+DEFAULT_OCR_LANG = "fra"
+# Confiance minimale (0-100) d'un mot retenu
+MIN_CONFIDENCE = 30
+
+
+class OcrUnavailable(RuntimeError):
+    """Moteur OCR ou langue demandée absents du poste"""
+
+
+@lru_cache(maxsize=1)
+def _installed_languages():
+    if pytesseract is None:
+        return None
+    try:
+        return frozenset(pytesseract.get_languages(config=""))
+    except (pytesseract.TesseractNotFoundError, OSError, RuntimeError):
+        return None
+
+
+def ocr_available(lang=DEFAULT_OCR_LANG):
+    """Vrai si Tesseract et les données de la langue ``lang`` sont installés"""
+    languages = _installed_languages()
+    return languages is not None and set(lang.split("+")) <= languages
+
+
+def check_ocr(lang):
+    """Lève :class:`OcrUnavailable` si l'OCR en ``lang`` est impossible"""
+    if pytesseract is None:
+        raise OcrUnavailable("OCR indisponible : installez Tesseract et le module pytesseract")
+    if _installed_languages() is None:
+        raise OcrUnavailable("OCR indisponible : exécutable Tesseract introuvable")
+    if not ocr_available(lang):
+        raise OcrUnavailable(f"Langue OCR non installée pour Tesseract : {lang}")
+
+
+def image_hash(img, lang):
+    """Empreinte des pixels analysés et de la langue : clé du cache OCR"""
+    digest = hashlib.sha256(f"{img.mode} {img.size} {lang}".encode("ascii"))
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+def recognize(img, lang=DEFAULT_OCR_LANG):
+    """Mots reconnus dans l'image : ``(texte, gauche, haut, largeur, hauteur)`` en pixels"""
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("L")
+    data = pytesseract.image_to_data(img, lang=lang, output_type=pytesseract.Output.DICT)
+    words = []
+    for text, confidence, left, top, width, height in zip(data["text"], data["conf"], data["left"],
+                                                          data["top"], data["width"], data["height"]):
+        text = text.strip()
+        if text and float(confidence) >= MIN_CONFIDENCE and width > 0 and height > 0:
+            words.append((text, left, top, width, height))
+    return words
+
+
+def recognize_page(img, lang=DEFAULT_OCR_LANG, cache=None):
+    """Mots reconnus dans l'image, via le cache OCR de ``cache`` (:class:`PageCache`)"""
+    if cache is None:
+        return recognize(img, lang)
+
+    key = image_hash(img, lang)
+    words = cache.get_text(key)
+    if words is None:
+        words = recognize(img, lang)
+        cache.put_text(key, words)
+    return words
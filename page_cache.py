@@ -0,0 +1,168 @@
+"""Cache disque des pages déjà préparées (décodées, redimensionnées, compressées).
+
+La clé combine l'empreinte SHA-256 du contenu source et les réglages de
+conversion : une reconstruction ne retraite que les images nouvelles ou
+modifiées. Les entrées les moins récemment utilisées sont supprimées quand
+le cache dépasse sa taille maximale.
+
+Le cache conserve aussi les mots reconnus par OCR (voir :mod:`ocr`), adressés
+par l'empreinte de l'image analysée plutôt que par la source.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+
+from pdf_writer import ImagePayload
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ogef_page_cache")
+DEFAULT_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+# À incrémenter quand le contenu produit pour une même clé change
+CACHE_VERSION = 6
+
+_CHUNK_SIZE = 1024 * 1024
+_SUFFIX = ".page"
+_TEXT_SUFFIX = ".ocr"
+_SUFFIXES = (_SUFFIX, _TEXT_SUFFIX)
+
+
+@lru_cache(maxsize=256)
+def _file_hash(path, mtime_ns, size):
+    """Empreinte d'un fichier, mémorisée tant qu'il n'est pas modifié
+    (un TIFF multipage n'est lu qu'une fois pour toutes ses pages)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash(source):
+    """Empreinte SHA-256 du contenu d'un fichier local"""
+    stat = os.stat(source)
+    return _file_hash(os.fspath(source), stat.st_mtime_ns, stat.st_size)
+
+
+class PageCache:
+    """Pages préparées stockées sur disque, adressées par contenu.
+
+    Seuls le dossier et la taille maximale sont conservés : l'objet peut être
+    transmis tel quel aux processus de conversion.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source, digest=None, **settings):
+        """Clé de cache : contenu source + réglages de conversion.
+
+        ``digest`` est l'empreinte du contenu si elle est déjà connue.
+        """
+        settings = dict(settings, version=CACHE_VERSION)
+        material = (digest or content_hash(source)) + json.dumps(settings, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key, suffix=_SUFFIX):
+        return os.path.join(self.directory, key + suffix)
+
+    def _write(self, path, *chunks):
+        """Écriture atomique (fichier temporaire renommé) ; un échec est ignoré"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, key):
+        """Page en cache, ou None si absente ou illisible"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                data = f.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        if len(data) != header.pop("length", -1):
+            return None
+        header["palette"] = bytes.fromhex(header["palette"])
+        if header["display_size"]:
+            header["display_size"] = tuple(header["display_size"])
+        header["strips"] = [tuple(strip) for strip in header.get("strips", [])]
+        header["text"] = [tuple(word) for word in header.get("text", [])]
+        return ImagePayload(data=data, **header)
+
+    def put(self, key, payload):
+        """Enregistre une page"""
+        header = {
+            "width": payload.width,
+            "height": payload.height,
+            "filter": payload.filter,
+            "color_space": payload.color_space,
+            "bits_per_component": payload.bits_per_component,
+            "decode_parms": payload.decode_parms,
+            "palette": payload.palette.hex(),
+            "display_size": payload.display_size,
+            "strips": payload.strips,
+            "fingerprint": payload.fingerprint,
+            "text": payload.text,
+            "length": len(payload.data),
+        }
+        self._write(self._path(key), json.dumps(header).encode("utf-8") + b"\n", payload.data)
+
+    def get_text(self, key):
+        """Mots reconnus par OCR en cache, ou None si absents"""
+        path = self._path(key, _TEXT_SUFFIX)
+        try:
+            with open(path, "rb") as f:
+                words = json.loads(f.read())
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return [tuple(word) for word in words]
+
+    def put_text(self, key, words):
+        """Enregistre les mots reconnus par OCR d'une image"""
+        self._write(self._path(key, _TEXT_SUFFIX), json.dumps(words, ensure_ascii=False).encode("utf-8"))
+
+    def total_bytes(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                   if entry.name.endswith(_SUFFIXES))
+
+    def evict(self):
+        """Supprime les entrées les plus anciennes jusqu'à respecter max_bytes"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(_SUFFIXES):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(_SUFFIXES):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,446 @@
+"""Écriture PDF en flux continu : chaque page est écrite dès qu'elle est prête.
+
+Contrairement à ``Image.save(..., save_all=True, append_images=...)`` de Pillow,
+aucune page décodée n'est conservée : seules les positions des objets (table
+xref) et les empreintes des images restent en mémoire jusqu'à la fermeture du
+document. Une image identique à une image déjà écrite n'est pas réécrite : les
+deux pages partagent le même XObject.
+
+Les mots reconnus par OCR (``ImagePayload.text``) sont écrits en texte
+invisible (mode de rendu 3) au-dessus de l'image : la page reste une image,
+mais le texte peut être recherché et sélectionné.
+
+Un document produit par ce writer peut être complété par une mise à jour
+incrémentale : les nouvelles pages, l'arbre des pages et une nouvelle table
+xref sont ajoutés en fin de fichier, sans relire les pages existantes.
+"""
+import hashlib
+import re
+import zlib
+from dataclasses import dataclass, field
+
+# Majorations utilisées par StreamingPdfWriter.projected_size : dictionnaires
+# de l'image, du contenu et de la page, puis objets écrits à la fermeture
+_PAGE_OVERHEAD = 1024
+_CLOSE_OVERHEAD = 512
+_XREF_ENTRY = 20
+# Majoration, hors texte, de la commande d'un mot de la couche texte
+_WORD_OVERHEAD = 96
+
+# Police de la couche texte : Courier (police standard, sans fichier à
+# intégrer), dont tous les caractères ont la même chasse
+_TEXT_FONT = {"Type": "Font", "Subtype": "Type1", "BaseFont": "Courier", "Encoding": "WinAnsiEncoding"}
+_COURIER_ADVANCE = 0.6
+
+
+DEFAULT_PRODUCER = "OGEF – Convertisseur Images ➜ PDF"
+
+
+# -------------------------------------------------
+# TYPES PDF
+# -------------------------------------------------
+class Name(str):
+    """Nom PDF (``/DeviceRGB``)"""
+
+
+class Ref(int):
+    """Référence indirecte vers un objet PDF (``12 0 R``)"""
+
+
+@dataclass
+class ImagePayload:
+    """Image déjà compressée, prête à être écrite comme XObject.
+
+    ``palette`` (RGB, 3 octets par couleur) rend l'espace colorimétrique
+    indexé ; ``display_size`` fixe la taille de la page en points quand elle
+    diffère de la taille de l'image en pixels. ``strips`` découpe une très
+    grande image en bandes horizontales, chacune écrite comme un XObject :
+    couples ``(hauteur, longueur)`` dont ``data`` contient les flux bout à bout.
+    ``fingerprint`` est l'empreinte perceptuelle de l'image, None si elle n'a
+    pas été calculée (voir :mod:`dedup`).
+    ``text`` contient les mots reconnus par OCR, ``(texte, gauche, haut,
+    largeur, hauteur)`` en pixels de l'image (voir :mod:`ocr`).
+    """
+    data: bytes
+    width: int
+    height: int
+    filter: str = "DCTDecode"
+    color_space: str = "DeviceRGB"
+    bits_per_component: int = 8
+    decode_parms: dict = field(default_factory=dict)
+    palette: bytes = b""
+    display_size: tuple = None
+    strips: list = field(default_factory=list)
+    fingerprint: int = None
+    text: list = field(default_factory=list)
+
+
+@dataclass
+class PdfState:
+    """Document existant à compléter : lu par :func:`read_pdf_state`"""
+    length: int
+    size: int
+    xref_offset: int
+    page_refs: list
+    info: Ref
+
+
+def _escape_string(text):
+    """Encode une chaîne PDF (littérale si ASCII, UTF-16 sinon)"""
+    try:
+        raw = text.encode("ascii")
+    except UnicodeEncodeError:
+        return "<" + ("\ufeff" + text).encode("utf-16-be").hex().upper() + ">"
+    escaped = raw.decode().replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return f"({escaped})"
+
+
+def _image_key(payload):
+    """Identité d'une image écrite : même flux et mêmes paramètres"""
+    return (hashlib.sha1(payload.data).digest(), payload.width, payload.height, payload.filter,
+            payload.color_space, payload.bits_per_component, repr(payload.decode_parms),
+            payload.palette, tuple(payload.strips))
+
+
+def _serialize(value):
+    """Sérialise une valeur Python en syntaxe PDF"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, Ref):
+        return f"{int(value)} 0 R"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return f"{value:.4f}".rstrip("0").rstrip(".")
+    if isinstance(value, Name):
+        return "/" + value
+    if isinstance(value, str):
+        return _escape_string(value)
+    if isinstance(value, bytes):
+        return "<" + value.hex().upper() + ">"
+    if isinstance(value, (list, tuple)):
+        return "[" + " ".join(_serialize(v) for v in value) + "]"
+    if isinstance(value, dict):
+        return "<<" + " ".join(f"/{k} {_serialize(v)}" for k, v in value.items()) + ">>"
+    if value is None:
+        return "null"
+    raise TypeError(f"Type non sérialisable en PDF : {type(value).__name__}")
+
+
+# -------------------------------------------------
+# WRITER
+# -------------------------------------------------
+class StreamingPdfWriter:
+    """Écrit un document PDF page par page dans un flux binaire.
+
+    Le flux n'a pas besoin d'être repositionnable : les décalages sont
+    comptés au fil de l'écriture.
+    """
+
+    CATALOG = Ref(1)
+    PAGES = Ref(2)
+
+    def __init__(self, fp, producer=DEFAULT_PRODUCER, previous=None):
+        """``previous`` (:class:`PdfState`) : le flux est positionné à la fin
+        d'un document existant, complété par une mise à jour incrémentale"""
+        self._fp = fp
+        self._offsets = {}
+        self._images = {}
+        self._font = None
+        self._producer = producer
+        self._previous = previous
+        self._closed = False
+        if previous is None:
+            self._offset = 0
+            self._next_num = 3
+            self._page_refs = []
+            self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        else:
+            self._offset = previous.length
+            self._next_num = previous.size
+            self._page_refs = list(previous.page_refs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    @property
+    def page_count(self):
+        return len(self._page_refs)
+
+    @property
+    def bytes_written(self):
+        return self._offset
+
+    def projected_size(self, payload):
+        """Taille (majorée) du document s'il était fermé après l'ajout de ``payload``"""
+        # Le texte d'une page est écrit même si son image est déjà dans le document
+        text = sum(2 * len(word[0]) + _WORD_OVERHEAD for word in payload.text)
+        if _image_key(payload) in self._images:
+            payload = ImagePayload(data=b"", width=payload.width, height=payload.height)
+        images = max(1, len(payload.strips))
+        objects = self._next_num + 4 + images
+        return (self._offset + len(payload.data) + images * (2 * len(payload.palette) + _PAGE_OVERHEAD)
+                + text + _CLOSE_OVERHEAD + _XREF_ENTRY * objects + 12 * (len(self._page_refs) + 1))
+
+    def _write(self, data):
+        self._fp.write(data)
+        self._offset += len(data)
+
+    def _allocate(self):
+        ref = Ref(self._next_num)
+        self._next_num += 1
+        return ref
+
+    def _write_object(self, ref, value, stream=None):
+        """Écrit un objet indirect (dictionnaire éventuellement suivi d'un flux)"""
+        self._offsets[int(ref)] = self._offset
+        if stream is not None:
+            value = dict(value, Length=len(stream))
+        self._write(f"{int(ref)} 0 obj\n{_serialize(value)}\n".encode("latin-1"))
+        if stream is not None:
+            self._write(b"stream\n")
+            self._write(stream)
+            self._write(b"\nendstream\n")
+        self._write(b"endobj\n")
+
+    def add_image(self, payload, height=None, data=None):
+        """Écrit une image XObject et renvoie sa référence.
+
+        ``height`` et ``data`` remplacent ceux de ``payload`` pour une bande.
+        """
+        height = height or payload.height
+        data = payload.data if data is None else data
+        ref = self._allocate()
+        color_space = Name(payload.color_space)
+        if payload.palette:
+            color_space = [Name("Indexed"), color_space, len(payload.palette) // 3 - 1, payload.palette]
+
+        header = {
+            "Type": Name("XObject"),
+            "Subtype": Name("Image"),
+            "Width": payload.width,
+            "Height": height,
+            "ColorSpace": color_space,
+            "BitsPerComponent": payload.bits_per_component,
+            "Filter": Name(payload.filter),
+        }
+        if payload.decode_parms:
+            header["DecodeParms"] = dict(payload.decode_parms)
+            if "Rows" in header["DecodeParms"]:
+                header["DecodeParms"]["Rows"] = height
+        self._write_object(ref, header, data)
+        return ref
+
+    def _add_images(self, payload):
+        """Écrit l'image (une XObject par bande) et renvoie leurs références"""
+        if not payload.strips:
+            return [self.add_image(payload)]
+        refs = []
+        offset = 0
+        for rows, length in payload.strips:
+            refs.append(self.add_image(payload, rows, payload.data[offset:offset + length]))
+            offset += length
+        return refs
+
+    @staticmethod
+    def _page_content(payload, refs, width, height):
+        """Ressources et contenu d'une page affichant l'image sur toute sa surface"""
+        if not payload.strips:
+            return {"Im0": refs[0]}, f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q"
+
+        resources = {}
+        commands = []
+        scale = height / payload.height
+        top = 0
+        for index, ((rows, _), ref) in enumerate(zip(payload.strips, refs)):
+            name = f"Im{index}"
+            resources[name] = ref
+            # Origine PDF en bas à gauche : la première bande est en haut de la page
+            commands.append(f"q {width} 0 0 {_serialize(rows * scale)} 0 "
+                            f"{_serialize(height - (top + rows) * scale)} cm /{name} Do Q")
+            top += rows
+        return resources, "\n".join(commands)
+
+    @staticmethod
+    def _text_layer(payload, width, height):
+        """Commandes de la couche de texte invisible : chaque mot est étiré
+        (``Tz``) pour couvrir sa boîte, ligne de base en bas de la boîte"""
+        scale_x = width / payload.width
+        scale_y = height / payload.height
+        commands = ["BT", "3 Tr"]
+        for text, left, top, word_width, word_height in payload.text:
+            size = word_height * scale_y
+            stretch = 100 * word_width * scale_x / (_COURIER_ADVANCE * size * len(text))
+            commands.append(f"/F0 {_serialize(size)} Tf {_serialize(stretch)} Tz "
+                            f"1 0 0 1 {_serialize(left * scale_x)} "
+                            f"{_serialize(height - (top + word_height) * scale_y)} Tm "
+                            f"{_serialize(text.encode('cp1252', 'replace'))} Tj")
+        commands.append("ET")
+        return "\n".join(commands)
+
+    def add_page(self, payload):
+        """Ajoute une page contenant une image pleine page"""
+        if self._closed:
+            raise ValueError("Le document PDF est déjà fermé")
+
+        # 1 pixel = 1 point (72 dpi), comme l'export PDF de Pillow
+        width, height = payload.display_size or (payload.width, payload.height)
+        key = _image_key(payload)
+        if key not in self._images:
+            self._images[key] = self._add_images(payload)
+        images, content = self._page_content(payload, self._images[key], width, height)
+        resources = {"XObject": images}
+        if payload.text:
+            if self._font is None:
+                self._font = self._allocate()
+                self._write_object(self._font, {k: Name(v) for k, v in _TEXT_FONT.items()})
+            resources["Font"] = {"F0": self._font}
+            content += "\n" + self._text_layer(payload, width, height)
+        content_ref = self._allocate()
+        page_ref = self._allocate()
+
+        if payload.text:
+            self._write_object(content_ref, {"Filter": Name("FlateDecode")},
+                               zlib.compress(content.encode("ascii")))
+        else:
+            self._write_object(content_ref, {}, content.encode("ascii"))
+        self._write_object(page_ref, {
+            "Type": Name("Page"),
+            "Parent": self.PAGES,
+            "MediaBox": [0, 0, width, height],
+            "Resources": resources,
+            "Contents": content_ref,
+        })
+        self._page_refs.append(page_ref)
+        return page_ref
+
+    def close(self):
+        """Écrit l'arbre des pages, le catalogue et la table xref"""
+        if self._closed:
+            return
+        self._closed = True
+
+        self._write_object(self.PAGES, {
+            "Type": Name("Pages"),
+            "Kids": list(self._page_refs),
+            "Count": len(self._page_refs),
+        })
+        if self._previous is None:
+            self._write_object(self.CATALOG, {"Type": Name("Catalog"), "Pages": self.PAGES})
+            info_ref = self._allocate()
+            self._write_object(info_ref, {"Producer": self._producer})
+        else:
+            # Mise à jour incrémentale : catalogue et informations inchangés
+            info_ref = self._previous.info
+
+        xref_offset = self._offset
+        size = self._next_num
+        lines = ["xref\n"]
+        if self._previous is None:
+            lines += [f"0 {size}\n", "0000000000 65535 f \n"]
+            lines += [f"{self._offsets.get(num, 0):010d} 00000 n \n" for num in range(1, size)]
+        else:
+            # Tête de la liste des objets libres, puis une sous-section par suite
+            # de numéros d'objets consécutifs
+            lines += ["0 1\n", "0000000000 65535 f \n"]
+            nums = sorted(self._offsets)
+            starts = [num for num in nums if num - 1 not in self._offsets]
+            for start in starts:
+                count = next(n for n in range(start, size + 1) if n not in self._offsets) - start
+                lines.append(f"{start} {count}\n")
+                lines += [f"{self._offsets[num]:010d} 00000 n \n" for num in range(start, start + count)]
+        self._write("".join(lines).encode("ascii"))
+
+        trailer = {"Size": size, "Root": self.CATALOG, "Info": info_ref}
+        if self._previous is not None:
+            trailer["Prev"] = self._previous.xref_offset
+        self._write(f"trailer\n{_serialize(trailer)}\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1"))
+
+
+# -------------------------------------------------
+# REPRISE D'UN DOCUMENT EXISTANT
+# -------------------------------------------------
+_STARTXREF = re.compile(rb"startxref\s+(\d+)\s+%%EOF\s*$")
+_TRAILER_REF = re.compile(rb"/(Root|Info) (\d+) 0 R")
+_TRAILER_INT = re.compile(rb"/(Size|Prev) (\d+)")
+_KIDS = re.compile(rb"/Kids \[([^\]]*)\]")
+
+
+def _read_xref_section(fp, offset):
+    """Table xref (numéro → position) et dictionnaire trailer d'une section"""
+    fp.seek(offset)
+    if fp.readline().strip() != b"xref":
+        raise ValueError("Table xref introuvable (PDF non produit par ce convertisseur)")
+
+    offsets = {}
+    while True:
+        line = fp.readline().strip()
+        if line == b"trailer":
+            break
+        start, count = (int(v) for v in line.split())
+        for num in range(start, start + count):
+            entry = fp.readline()
+            if entry[17:18] == b"n":
+                offsets[num] = int(entry[:10])
+
+    trailer = fp.readline()
+    values = {key.decode(): int(num) for key, num in _TRAILER_REF.findall(trailer)}
+    values.update({key.decode(): int(num) for key, num in _TRAILER_INT.findall(trailer)})
+    return offsets, values
+
+
+def _read_object(fp, offset):
+    """Contenu brut d'un objet sans flux (jusqu'à ``endobj``)"""
+    fp.seek(offset)
+    data = b""
+    while b"endobj" not in data:
+        chunk = fp.read(64 * 1024)
+        if not chunk:
+            break
+        data += chunk
+    return data.split(b"endobj", 1)[0]
+
+
+def read_pdf_state(fp, producer=DEFAULT_PRODUCER):
+    """Lit la fin d'un PDF produit par ce writer (trailer, xref, arbre des pages).
+
+    Seules la table xref, le trailer, l'arbre des pages et les informations du
+    document sont lus. Lève ``ValueError`` si le fichier n'a pas été produit
+    par ce writer (producteur différent ou structure inattendue).
+    """
+    fp.seek(0, 2)
+    length = fp.tell()
+    fp.seek(max(0, length - 1024))
+    match = _STARTXREF.search(fp.read())
+    if match is None:
+        raise ValueError("Fin de fichier PDF introuvable")
+    xref_offset = int(match.group(1))
+
+    # Les sections les plus récentes priment sur les précédentes (/Prev)
+    offsets, trailer = _read_xref_section(fp, xref_offset)
+    previous = trailer.get("Prev")
+    while previous is not None:
+        older, older_trailer = _read_xref_section(fp, previous)
+        offsets = {**older, **offsets}
+        previous = older_trailer.get("Prev")
+
+    if trailer.get("Root") != int(StreamingPdfWriter.CATALOG) or "Info" not in trailer:
+        raise ValueError("Structure PDF inattendue (PDF non produit par ce convertisseur)")
+    if _escape_string(producer).encode("latin-1") not in _read_object(fp, offsets[trailer["Info"]]):
+        raise ValueError("PDF non produit par ce convertisseur")
+
+    kids = _KIDS.search(_read_object(fp, offsets[int(StreamingPdfWriter.PAGES)]))
+    # Sans la liste des pages, la mise à jour remplacerait l'arbre par les seules nouvelles pages
+    if kids is None:
+        raise ValueError("Arbre des pages illisible (PDF non produit par ce convertisseur)")
+    return PdfState(
+        length=length,
+        size=trailer["Size"],
+        xref_offset=xref_offset,
+        page_refs=[Ref(int(num)) for num in re.findall(rb"(\d+) 0 R", kids.group(1))],
+        info=Ref(trailer["Info"]),
+    )
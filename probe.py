@@ -0,0 +1,169 @@
+"""Lecture rapide des en-têtes d'images, sans décodage des pixels.
+
+Dimensions, mode, nombre d'images (TIFF multipage, GIF), date de prise de
+vue et orientation EXIF : de quoi valider une sélection, estimer la taille
+et la durée de la conversion et trier par date de prise de vue avant tout
+décodage. Les résultats sont mémorisés par fichier (chemin, date de
+modification, taille).
+"""
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+
+from PIL import ExifTags
+
+from strips import open_image
+
+# Octets de JPEG par pixel de sortie selon la qualité, mesurés sur les corpus
+# du banc d'essai (benchmarks/bench_conversion.py)
+JPEG_BYTES_PER_PIXEL = {50: 0.07, 75: 0.12, 85: 0.18, 95: 0.30, 100: 0.60}
+# Décodage, réduction et compression sur un cœur, par mégapixel source
+SECONDS_PER_MEGAPIXEL = 0.05
+
+_EXIF_DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    """Métadonnées lues dans l'en-tête d'une image"""
+    width: int = 0
+    height: int = 0
+    mode: str = ""
+    format: str = ""
+    frames: int = 1
+    exif_date: str = None
+    orientation: int = 1
+    error: str = ""
+
+    @property
+    def valid(self):
+        return not self.error
+
+    @property
+    def pixels(self):
+        return self.width * self.height
+
+
+def _exif_fields(img):
+    """Date de prise de vue (format EXIF) et orientation, si présentes"""
+    try:
+        exif = img.getexif()
+    except Exception:
+        return None, 1
+    date = exif.get_ifd(ExifTags.IFD.Exif).get(ExifTags.Base.DateTimeOriginal)
+    date = date or exif.get(ExifTags.Base.DateTime)
+    if isinstance(date, bytes):
+        date = date.decode("ascii", "replace")
+    orientation = exif.get(ExifTags.Base.Orientation, 1)
+    return (date.strip("\x00 ") or None) if date else None, orientation
+
+
+def read_header(source):
+    """Lit l'en-tête d'une source (chemin ou fichier) ; ``error`` est renseigné si illisible"""
+    try:
+        with open_image(source) as img:
+            exif_date, orientation = _exif_fields(img)
+            return ImageInfo(
+                width=img.size[0],
+                height=img.size[1],
+                mode=img.mode,
+                format=img.format or "",
+                frames=max(1, getattr(img, "n_frames", 1)),
+                exif_date=exif_date,
+                orientation=orientation,
+            )
+    except Exception as e:
+        return ImageInfo(error=str(e) or type(e).__name__)
+
+
+@lru_cache(maxsize=8192)
+def _probe_file(path, mtime_ns, size):
+    return read_header(path)
+
+
+def probe_image(source):
+    """Métadonnées d'une image, mémorisées tant qu'un fichier local n'est pas modifié"""
+    if not isinstance(source, (str, os.PathLike)):
+        return read_header(source)
+    try:
+        stat = os.stat(source)
+    except OSError as e:
+        return ImageInfo(error=str(e))
+    return _probe_file(os.fspath(source), stat.st_mtime_ns, stat.st_size)
+
+
+def probe_known(path, mtime_ns, size):
+    """Métadonnées d'un fichier local dont la date de modification et la taille
+    sont déjà connues (index du dossier, copie d'un upload) : sans ``os.stat``"""
+    return _probe_file(os.fspath(path), mtime_ns, size)
+
+
+def capture_date(path):
+    """Date de prise de vue EXIF, ou à défaut date de création du fichier (format EXIF)"""
+    info = probe_image(path)
+    if info.exif_date:
+        return info.exif_date
+    try:
+        return datetime.fromtimestamp(os.path.getctime(path)).strftime(_EXIF_DATE_FORMAT)
+    except OSError:
+        return ""
+
+
+# -------------------------------------------------
+# ESTIMATIONS
+# -------------------------------------------------
+def jpeg_bytes_per_pixel(quality):
+    """Interpolation linéaire de JPEG_BYTES_PER_PIXEL"""
+    points = sorted(JPEG_BYTES_PER_PIXEL.items())
+    if quality <= points[0][0]:
+        return points[0][1]
+    for (q0, b0), (q1, b1) in zip(points, points[1:]):
+        if quality <= q1:
+            return b0 + (b1 - b0) * (quality - q0) / (q1 - q0)
+    return points[-1][1]
+
+
+def calibrate(summary, quality):
+    """Facteurs de correction des estimations d'après une conversion terminée
+    (``StatsCollector.summary()``), ou None si elle ne permet pas de mesurer"""
+    if not summary["pixels_in"] or not summary["pixels_out"]:
+        return None
+    return {
+        "bytes": summary["bytes_out"] / summary["pixels_out"] / jpeg_bytes_per_pixel(quality),
+        "seconds": sum(summary["stages"].values()) / (summary["pixels_in"] / 1e6) / SECONDS_PER_MEGAPIXEL,
+    }
+
+
+def estimate_conversion(items, max_dimension, quality, jpeg_passthrough=False, workers=1,
+                        calibration=None):
+    """Estime pages, taille du PDF (octets) et durée (s) d'une conversion.
+
+    ``items`` est une suite de couples ``(ImageInfo, taille du fichier)`` ;
+    les images illisibles sont ignorées. ``calibration`` (voir
+    :func:`calibrate`) corrige les valeurs de référence.
+    """
+    calibration = calibration or {"bytes": 1.0, "seconds": 1.0}
+    bytes_per_pixel = jpeg_bytes_per_pixel(quality) * calibration["bytes"]
+    seconds_per_megapixel = SECONDS_PER_MEGAPIXEL * calibration["seconds"]
+    pages = total_bytes = seconds = 0
+
+    for info, file_size in items:
+        if not info.valid:
+            continue
+        pages += info.frames
+        longest = max(info.width, info.height)
+        if (jpeg_passthrough and info.format == "JPEG" and info.mode in ("RGB", "L")
+                and longest <= max_dimension):
+            total_bytes += file_size
+            continue
+
+        scale = min(1.0, max_dimension / longest) if longest else 1.0
+        total_bytes += info.frames * info.pixels * scale * scale * bytes_per_pixel
+        seconds += info.frames * info.pixels / 1e6 * seconds_per_megapixel
+
+    return {
+        "pages": pages,
+        "bytes": int(total_bytes),
+        "seconds": seconds / max(1, min(workers, pages)),
+    }
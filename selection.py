@@ -0,0 +1,54 @@
+"""Sélection d'images dans une longue liste affichée page par page.
+
+L'état d'une sélection tient dans un ensemble compact : le choix par défaut
+(tout sélectionné ou rien) et les noms qui y font exception. « Tout
+sélectionner » vide l'ensemble au lieu d'énumérer les milliers de noms d'un
+dossier, et la liste ordonnée des images retenues est recalculée à la
+demande, sans widget par image.
+"""
+
+
+class Selection:
+    """Images sélectionnées : choix par défaut et exceptions"""
+
+    def __init__(self, default=True):
+        self.default = default
+        self.exceptions = set()
+        # Incrémentée à chaque changement global : les cases à cocher déjà
+        # affichées (clés de widgets) ne reprennent pas leur ancien état
+        self.generation = 0
+
+    def __contains__(self, name):
+        return (name in self.exceptions) != self.default
+
+    def set(self, name, selected):
+        """Sélectionne ou désélectionne une image"""
+        if selected == self.default:
+            self.exceptions.discard(name)
+        else:
+            self.exceptions.add(name)
+
+    def set_all(self, selected):
+        """Sélectionne ou désélectionne toutes les images"""
+        self.default = selected
+        self.exceptions.clear()
+        self.generation += 1
+
+    def selected(self, names):
+        """Noms sélectionnés, dans l'ordre de ``names``"""
+        if not self.exceptions:
+            return list(names) if self.default else []
+        return [name for name in names if name in self]
+
+
+def page_count(total, per_page):
+    """Nombre de pages de la grille (au moins une)"""
+    return max(1, -(-total // per_page))
+
+
+def page_bounds(total, page, per_page):
+    """Bornes ``(début, fin)`` des éléments de la page ``page`` (à partir de 1),
+    ramenée dans les limites de la grille"""
+    page = min(max(1, page), page_count(total, per_page))
+    start = (page - 1) * per_page
+    return start, min(total, start + per_page)
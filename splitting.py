@@ -0,0 +1,313 @@
+"""Découpage d'une conversion en plusieurs PDF, pour les portails qui
+limitent la taille des fichiers déposés.
+
+Deux limites, cumulables :
+
+- ``max_pages`` seule : les parties sont connues d'avance et construites en
+  parallèle, chacune par son propre :func:`write_pdf` ;
+- ``max_bytes`` : la taille d'une page n'est connue qu'une fois compressée,
+  une partie est donc fermée dès que la page suivante lui ferait dépasser
+  la limite (les pages restent préparées en parallèle).
+
+Les parties sont écrites dans un dossier ou dans une archive ZIP, entrée par
+entrée depuis le writer PDF : aucune n'est conservée en mémoire.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from conversion import (ConversionCancelled, expand_pages, iter_prepared_pages, page_name,
+                        write_pdf_to_file)
+from metrics import DocumentMetrics, PeakMemory
+from pdf_writer import StreamingPdfWriter
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def part_name(base_name, index):
+    """Nom de la partie ``index`` (à partir de 1) : ``Dossier_partie01.pdf``"""
+    return f"{Path(base_name).stem}_partie{index:02d}.pdf"
+
+
+def _open_entry(archive, name):
+    """Ouvre une entrée de l'archive en écriture, datée de maintenant.
+
+    Taille inconnue à l'ouverture : ZIP64 pour les parties de plus de 2 Go.
+    """
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    return archive.open(info, "w", force_zip64=True)
+
+
+# -------------------------------------------------
+# DESTINATIONS DES PARTIES
+# -------------------------------------------------
+class DirectoryParts:
+    """Parties écrites dans un dossier, chacune via un fichier ``.part`` renommé"""
+
+    def __init__(self, directory, base_name):
+        self.directory = directory
+        self.base_name = base_name
+        self.paths = []
+        self._fp = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, index):
+        return os.path.join(self.directory, part_name(self.base_name, index))
+
+    def open(self, index):
+        self._fp = open(self._path(index) + ".part", "wb")
+        return self._fp
+
+    def close(self, index):
+        self._fp.close()
+        self._fp = None
+        os.replace(self._path(index) + ".part", self._path(index))
+        self.paths.append(self._path(index))
+
+    def abort(self, index):
+        """Supprime la partie en cours et celles déjà écrites"""
+        if self._fp is not None:
+            self._fp.close()
+            os.remove(self._fp.name)
+            self._fp = None
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class ZipParts:
+    """Parties écrites directement comme entrées d'une archive ZIP ouverte"""
+
+    def __init__(self, archive, base_name):
+        self.archive = archive
+        self.base_name = base_name
+        self._fp = None
+
+    def open(self, index):
+        self._fp = _open_entry(self.archive, part_name(self.base_name, index))
+        return self._fp
+
+    def close(self, index):
+        self._fp.close()
+        self._fp = None
+
+    def abort(self, index):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+
+class _PagesOnly:
+    """Transmet les mesures des pages d'une partie, pas celles de son document"""
+
+    def __init__(self, metrics):
+        self._metrics = metrics
+
+    def record_page(self, page):
+        self._metrics.record_page(page)
+
+    def record_document(self, document):
+        pass
+
+
+# -------------------------------------------------
+# CONSTRUCTION DES PARTIES
+# -------------------------------------------------
+def _write_rolling(pages, parts, max_pages=None, max_bytes=None, metrics=None, on_progress=None,
+                   on_error=None, cancel_event=None, **options):
+    """Écrit les pages dans l'ordre en changeant de partie à chaque limite atteinte.
+
+    Renvoie le nombre de pages de chaque partie et le nombre d'images ignorées.
+    """
+    counts = []
+    skipped = 0
+    writer = None
+    prepared = iter_prepared_pages(pages, **options)
+    try:
+        for idx, (page, payload, page_metrics, error) in enumerate(prepared):
+            if cancel_event is not None and cancel_event.is_set():
+                raise ConversionCancelled("Conversion annulée")
+
+            name = page_name(page)
+            if on_progress:
+                on_progress(idx, len(pages), name)
+
+            if error is not None:
+                skipped += 1
+                if on_error:
+                    on_error(name, error)
+                continue
+
+            # Une page seule plus grosse que la limite forme sa propre partie
+            if writer is not None and (writer.page_count == max_pages
+                                       or (max_bytes and writer.projected_size(payload) > max_bytes)):
+                writer.close()
+                counts.append(writer.page_count)
+                parts.close(len(counts))
+                writer = None
+
+            if writer is None:
+                writer = StreamingPdfWriter(parts.open(len(counts) + 1))
+            with page_metrics.stage("ecriture"):
+                writer.add_page(payload)
+            if metrics is not None:
+                metrics.record_page(page_metrics)
+
+        if writer is None:
+            raise ValueError("Aucune image valide n'a pu être traitée")
+        writer.close()
+        counts.append(writer.page_count)
+        parts.close(len(counts))
+    except BaseException:
+        parts.abort(len(counts) + 1)
+        raise
+    finally:
+        prepared.close()
+
+    return counts, skipped
+
+
+def _write_parallel(pages, directory, base_name, max_pages, workers=1, metrics=None,
+                    on_progress=None, on_error=None, **options):
+    """Construit simultanément les parties de ``max_pages`` pages, une par thread.
+
+    Les processus de conversion sont répartis entre les parties en cours.
+    Renvoie les chemins et le nombre de pages de chaque partie, et le nombre
+    d'images ignorées.
+    """
+    chunks = [pages[start:start + max_pages] for start in range(0, len(pages), max_pages)]
+    concurrency = min(len(chunks), max(1, workers))
+    lock = threading.Lock()
+    progress = {"done": 0, "skipped": 0}
+
+    def count_page(idx, total, name):
+        with lock:
+            progress["done"] += 1
+            if on_progress:
+                on_progress(progress["done"] - 1, len(pages), name)
+
+    def count_error(name, error):
+        with lock:
+            progress["skipped"] += 1
+            if on_error:
+                on_error(name, error)
+
+    def build(index, chunk):
+        path = os.path.join(directory, part_name(base_name, index))
+        try:
+            count = write_pdf_to_file(chunk, path, workers=max(1, workers // concurrency),
+                                      metrics=_PagesOnly(metrics) if metrics is not None else None,
+                                      on_progress=count_page, on_error=count_error, **options)
+        except ValueError:
+            return path, 0  # Aucune image valide dans cette partie
+        return path, count
+
+    os.makedirs(directory, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(build, index, chunk) for index, chunk in enumerate(chunks, start=1)]
+
+    # Une partie en échec (ou annulée) invalide tout le découpage
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        for future in futures:
+            if future.exception() is None and future.result()[1]:
+                os.remove(future.result()[0])
+        raise errors[0]
+
+    built = [future.result() for future in futures if future.result()[1]]
+    if not built:
+        raise ValueError("Aucune image valide n'a pu être traitée")
+    return built, progress["skipped"]
+
+
+def _record_document(metrics, started, page_count, skipped, bytes_out):
+    if metrics is not None:
+        metrics.record_document(DocumentMetrics(
+            pages=page_count,
+            skipped=skipped,
+            seconds=time.perf_counter() - started,
+            bytes_out=bytes_out,
+            peak_rss_mb=metrics.peak_rss_mb,
+        ))
+
+
+def write_pdf_parts(sources, directory, base_name, max_pages=None, max_bytes=None, metrics=None,
+                    **options):
+    """Écrit la conversion en plusieurs PDF dans ``directory``.
+
+    Les parties sont nommées d'après ``base_name`` (voir :func:`part_name`).
+    Les autres options sont celles de :func:`write_pdf`. Renvoie la liste
+    des couples ``(chemin, nombre de pages)``.
+    """
+    started = time.perf_counter()
+    if metrics is not None:
+        metrics = PeakMemory(metrics)
+    pages = expand_pages(sources)
+
+    if max_pages and not max_bytes:
+        parts, skipped = _write_parallel(pages, directory, base_name, max_pages,
+                                         metrics=metrics, **options)
+    else:
+        sink = DirectoryParts(directory, base_name)
+        counts, skipped = _write_rolling(pages, sink, max_pages=max_pages, max_bytes=max_bytes,
+                                         metrics=metrics, **options)
+        parts = list(zip(sink.paths, counts))
+
+    if options.get("cache") is not None:
+        options["cache"].evict()
+    _record_document(metrics, started, sum(count for _, count in parts), skipped,
+                     sum(os.path.getsize(path) for path, _ in parts))
+    return parts
+
+
+def write_pdf_zip(sources, zip_path, base_name, max_pages=None, max_bytes=None, metrics=None,
+                  **options):
+    """Écrit la conversion en plusieurs PDF réunis dans une archive ZIP.
+
+    Avec ``max_bytes``, chaque partie est écrite directement dans son entrée
+    de l'archive ; avec ``max_pages`` seule, les parties sont construites en
+    parallèle dans un dossier temporaire puis recopiées par blocs. L'archive
+    est écrite dans ``<zip_path>.part`` puis renommée. Renvoie la liste des
+    couples ``(nom de l'entrée, nombre de pages)``.
+    """
+    started = time.perf_counter()
+    if metrics is not None:
+        metrics = PeakMemory(metrics)
+    pages = expand_pages(sources)
+    partial_path = zip_path + ".part"
+    try:
+        # Les PDF sont déjà compressés : entrées stockées telles quelles
+        with zipfile.ZipFile(partial_path, "w", compression=zipfile.ZIP_STORED) as archive:
+            if max_pages and not max_bytes:
+                with tempfile.TemporaryDirectory(prefix="ogef_parts_") as tmp_dir:
+                    built, skipped = _write_parallel(pages, tmp_dir, base_name, max_pages,
+                                                     metrics=metrics, **options)
+                    parts = []
+                    for path, count in built:
+                        name = os.path.basename(path)
+                        with open(path, "rb") as src, _open_entry(archive, name) as dst:
+                            shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+                        os.remove(path)
+                        parts.append((name, count))
+            else:
+                counts, skipped = _write_rolling(pages, ZipParts(archive, base_name),
+                                                 max_pages=max_pages, max_bytes=max_bytes,
+                                                 metrics=metrics, **options)
+                parts = [(part_name(base_name, index), count)
+                         for index, count in enumerate(counts, start=1)]
+        os.replace(partial_path, zip_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    if options.get("cache") is not None:
+        options["cache"].evict()
+    _record_document(metrics, started, sum(count for _, count in parts), skipped,
+                     os.path.getsize(zip_path))
+    return parts
@@ -0,0 +1,251 @@
+"""Traitement par bandes des très grandes images (plans A0 scannés à 600 dpi...).
+
+Au-delà de LARGE_IMAGE_PIXELS, une page n'est plus décodée, convertie et
+réduite d'un seul bloc : elle est traitée par bandes horizontales d'environ
+BAND_PIXELS pixels. Les données non compressées (TIFF, BMP, PPM) sont lues
+bande par bande directement dans le fichier ; les autres formats, que
+Pillow ne sait décoder qu'en entier, le sont une fois, sans copie pleine
+taille supplémentaire.
+
+Une image de sortie elle-même trop grande (noir et blanc gardé en
+définition d'origine, dimension maximale élevée) est écrite en plusieurs
+XObjects, une bande chacun (voir ``ImagePayload.strips``).
+"""
+import os
+import struct
+from contextlib import nullcontext
+
+from PIL import Image
+
+from normalize import normalize
+from pdf_writer import ImagePayload
+
+# Au-delà, une page est traitée par bandes
+LARGE_IMAGE_PIXELS = 50_000_000
+# Pixels source par bande
+BAND_PIXELS = 8_000_000
+# Écart minimal entre la réduction entière par bandes et la taille finale,
+# pour que le redimensionnement LANCZOS final garde sa qualité
+BAND_REDUCING_GAP = 2.0
+# Rayon du filtre LANCZOS (en pixels de sortie) : lignes voisines nécessaires
+# au redimensionnement d'une bande sans raccord visible
+_LANCZOS_SUPPORT = 3
+
+
+# Bits par pixel des données brutes lisibles par bandes
+_RAW_BITS = {
+    "1": 1, "1;I": 1, "1;R": 1, "1;IR": 1,
+    "L": 8, "L;I": 8, "P": 8,
+    "LA": 16, "I;16": 16, "I;16B": 16,
+    "RGB": 24, "BGR": 24,
+    "RGBA": 32, "RGBX": 32, "BGRA": 32, "BGRX": 32, "CMYK": 32,
+}
+
+
+def open_image(source):
+    """Ouvre une image comme ``Image.open``, sans sa limite de pixels.
+
+    La limite de Pillow (DecompressionBombError) reste en vigueur pour le
+    reste du processus : seule une image qui la dépasse est ouverte ici
+    directement par son plugin. Elle peut être lue par bandes ; son décodage
+    en entier reste soumis à la même limite, via :func:`check_decodable`.
+    """
+    try:
+        return Image.open(source)
+    except Image.DecompressionBombError:
+        pass
+
+    is_path = isinstance(source, (str, os.PathLike))
+    fp = open(source, "rb") if is_path else source
+    try:
+        fp.seek(0)
+        prefix = fp.read(16)
+        Image.init()
+        for name in Image.ID:
+            factory, accept = Image.OPEN[name]
+            accepted = not accept or accept(prefix)
+            if not accepted or isinstance(accepted, str):
+                continue
+            fp.seek(0)
+            try:
+                img = factory(fp, os.fspath(source) if is_path else "")
+            except (SyntaxError, IndexError, TypeError, struct.error):
+                continue
+            # Comme Image.open : le fichier ouvert ici est fermé avec l'image
+            img._exclusive_fp = is_path
+            return img
+    except BaseException:
+        if is_path:
+            fp.close()
+        raise
+    if is_path:
+        fp.close()
+    raise Image.UnidentifiedImageError(f"cannot identify image file {source!r}")
+
+
+def check_decodable(img):
+    """Lève ``DecompressionBombError`` si l'image est trop grande pour être
+    décodée en entier (même limite que ``Image.open``)"""
+    width, height = img.size
+    if Image.MAX_IMAGE_PIXELS and width * height > 2 * Image.MAX_IMAGE_PIXELS:
+        raise Image.DecompressionBombError(
+            f"Image trop grande pour être décodée en entier ({width} × {height} px) : "
+            f"enregistrez-la en TIFF non compressé pour un traitement par bandes"
+        )
+
+
+def band_rows(width, factor=1):
+    """Hauteur des bandes : environ BAND_PIXELS pixels, multiple de ``factor``"""
+    rows = max(1, BAND_PIXELS // max(1, width))
+    return max(factor, rows // factor * factor)
+
+
+# -------------------------------------------------
+# LECTURE PAR BANDES
+# -------------------------------------------------
+def _raw_strips(img):
+    """Blocs de données brutes de l'image, sur toute sa largeur :
+    ``(haut, bas, position, rawmode, pas, orientation)``, ou None si
+    l'image ne peut pas être lue par bandes"""
+    width = img.size[0]
+    strips = []
+    for codec, extents, offset, args in img.tile:
+        if codec != "raw" or extents[0] != 0 or extents[2] != width:
+            return None
+        if isinstance(args, str):
+            args = (args,)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        if not stride:
+            if rawmode not in _RAW_BITS:
+                return None
+            stride = (width * _RAW_BITS[rawmode] + 7) // 8
+        strips.append((extents[1], extents[3], offset, rawmode, stride, orientation))
+    return sorted(strips) or None
+
+
+def _read_band(fp, img, strips, top, bottom):
+    width = img.size[0]
+    band = Image.new(img.mode, (width, bottom - top))
+    for strip_top, strip_bottom, offset, rawmode, stride, orientation in strips:
+        first, last = max(top, strip_top), min(bottom, strip_bottom)
+        if first >= last:
+            continue
+        # Orientation négative (BMP) : lignes stockées de bas en haut
+        row = strip_bottom - last if orientation < 0 else first - strip_top
+        fp.seek(offset + row * stride)
+        data = fp.read((last - first) * stride)
+        part = Image.frombytes(img.mode, (width, last - first), data, "raw", rawmode, stride, orientation)
+        band.paste(part, (0, first - top))
+
+    if img.mode == "P":
+        band.putpalette(img.getpalette())
+        band.info.update(img.info)
+    return band
+
+
+def iter_bands(img, source, rows):
+    """Bandes horizontales successives de ``rows`` lignes : couples ``(haut, bande)``.
+
+    ``img`` est l'image ouverte (positionnée sur l'image voulue d'un TIFF
+    multipage) et non encore décodée.
+    """
+    width, height = img.size
+    strips = _raw_strips(img)
+    if strips is None:
+        check_decodable(img)
+        img.load()
+        for top in range(0, height, rows):
+            yield top, img.crop((0, top, width, min(height, top + rows)))
+        return
+
+    is_path = isinstance(source, (str, os.PathLike))
+    with open(source, "rb") if is_path else nullcontext(source) as fp:
+        for top in range(0, height, rows):
+            yield top, _read_band(fp, img, strips, top, min(height, top + rows))
+
+
+# -------------------------------------------------
+# RÉDUCTION ET ENCODAGE PAR BANDES
+# -------------------------------------------------
+def reduction_factor(size, target):
+    """Facteur de réduction entière appliqué aux bandes avant le redimensionnement final"""
+    scale = min(size[0] / target[0], size[1] / target[1])
+    return max(1, int(scale / BAND_REDUCING_GAP))
+
+
+def reduce_bands(img, source, factor, mode):
+    """Image convertie en ``mode`` et réduite d'un facteur entier, traitée par bandes"""
+    width, height = img.size
+    reduced = Image.new(mode, (-(-width // factor), -(-height // factor)))
+    for top, band in iter_bands(img, source, band_rows(width, factor)):
+        band = normalize(band, mode)
+        if factor > 1:
+            band = band.reduce(factor)
+        reduced.paste(band, (0, top // factor))
+    return reduced
+
+
+def _stack(upper, lower):
+    stacked = Image.new(upper.mode, (upper.size[0], upper.size[1] + lower.size[1]))
+    stacked.paste(upper, (0, 0))
+    stacked.paste(lower, (0, upper.size[1]))
+    return stacked
+
+
+def resize_bands(bands, size, target):
+    """Redimensionne en LANCZOS à la taille ``target`` une image de taille
+    ``size`` fournie par bandes successives (sur toute sa largeur).
+
+    Chaque bande de sortie est calculée avec les lignes voisines de la
+    source, conservées d'une bande à l'autre : le résultat est celui d'un
+    redimensionnement de l'image entière, sans raccord entre les bandes.
+    """
+    width, height = size
+    scale = height / target[1]
+    margin = int(_LANCZOS_SUPPORT * max(1.0, scale)) + 2
+    buffer, buffer_top, bottom, done = None, 0, 0, 0
+    for band in bands:
+        buffer = band if buffer is None else _stack(buffer, band)
+        bottom += band.size[1]
+        # Lignes de sortie dont toutes les lignes sources sont disponibles
+        end = target[1] if bottom >= height else min(target[1], int((bottom - margin) / scale))
+        if end > done:
+            box = (0, done * scale - buffer_top, width, end * scale - buffer_top)
+            yield buffer.resize((target[0], end - done), Image.Resampling.LANCZOS, box=box)
+            done = end
+        keep = max(buffer_top, int(done * scale) - margin)
+        buffer = buffer.crop((0, keep - buffer_top, width, bottom - buffer_top))
+        buffer_top = keep
+
+
+def encode_bands(img, source, encode, factor=1, mode=None, target=None):
+    """Encode l'image bande par bande (``encode`` : image → :class:`ImagePayload`),
+    après conversion en ``mode``, réduction d'un facteur entier puis, avec
+    ``target``, redimensionnement à cette taille exacte.
+
+    Renvoie une image en plusieurs XObjects (``ImagePayload.strips``).
+    """
+    def reduced_bands():
+        for _, band in iter_bands(img, source, band_rows(img.size[0], factor)):
+            if mode is not None:
+                band = normalize(band, mode)
+            yield band.reduce(factor) if factor > 1 else band
+
+    bands = reduced_bands()
+    if target is not None:
+        reduced_size = (-(-img.size[0] // factor), -(-img.size[1] // factor))
+        bands = resize_bands(bands, reduced_size, target)
+    parts = [encode(band) for band in bands]
+
+    first = parts[0]
+    return ImagePayload(
+        data=b"".join(part.data for part in parts),
+        width=first.width,
+        height=sum(part.height for part in parts),
+        filter=first.filter,
+        color_space=first.color_space,
+        bits_per_component=first.bits_per_component,
+        decode_parms=first.decode_parms,
+        palette=first.palette,
+        strips=[(part.height, len(part.data)) for part in parts],
+    )
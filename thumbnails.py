@@ -0,0 +1,120 @@
+"""Cache de miniatures pour les grilles d'aperçu.
+
+Les miniatures sont décodées en taille réduite (``Image.draft`` pour les
+JPEG, par bandes pour les très grandes images) puis conservées compressées
+dans un cache LRU borné en octets. La clé d'un fichier combine chemin, date
+de modification et taille (les fichiers uploadés sont copiés sur disque,
+voir :mod:`uploads`).
+
+Les miniatures de la page suivante d'une grille peuvent être préparées en
+arrière-plan (:meth:`ThumbnailCache.prefetch`) pendant que l'utilisateur
+parcourt la page affichée.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from normalize import normalize
+from strips import LARGE_IMAGE_PIXELS, open_image, reduce_bands, reduction_factor
+
+THUMBNAIL_SIZE = 320
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# Threads de préparation des miniatures en arrière-plan
+PREFETCH_WORKERS = 2
+
+
+def source_key(source):
+    """Clé de cache d'un fichier local"""
+    stat = os.stat(source)
+    return ("fichier", os.path.abspath(source), stat.st_mtime_ns, stat.st_size)
+
+
+def make_thumbnail(source, size=THUMBNAIL_SIZE):
+    """Décode une image en taille réduite et renvoie une miniature JPEG"""
+    with open_image(source) as img:
+        # Décodage JPEG directement à l'échelle 1/2, 1/4 ou 1/8
+        img.draft("RGB", (size, size))
+        if img.size[0] * img.size[1] > LARGE_IMAGE_PIXELS:
+            img = reduce_bands(img, source, reduction_factor(img.size, (size, size)), "RGB")
+        img.thumbnail((size, size), Image.Resampling.BILINEAR)
+        # Transparence sur fond blanc, 16 bits et CMYK ramenés en RGB 8 bits
+        thumb = normalize(img, "RGB")
+
+        buffer = io.BytesIO()
+        thumb.save(buffer, format="JPEG", quality=85)
+        return buffer.getvalue()
+
+
+class ThumbnailCache:
+    """Cache LRU de miniatures, borné par la taille totale des données"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, size=THUMBNAIL_SIZE):
+        self.max_bytes = max_bytes
+        self.size = size
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._prefetching = set()
+        self._executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS,
+                                            thread_name_prefix="miniatures")
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, source):
+        """Miniature JPEG de la source, depuis le cache ou générée à la demande"""
+        key = source_key(source)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        data = make_thumbnail(source, self.size)
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = data
+                self._total_bytes += len(data)
+                self._evict()
+        return data
+
+    def prefetch(self, sources):
+        """Prépare en arrière-plan les miniatures absentes du cache (chemins locaux)"""
+        for source in sources:
+            try:
+                key = source_key(source)
+            except OSError:
+                continue
+            with self._lock:
+                if key in self._entries or key in self._prefetching:
+                    continue
+                self._prefetching.add(key)
+            self._executor.submit(self._prefetch_one, source, key)
+
+    def _prefetch_one(self, source, key):
+        try:
+            self.get(source)
+        except Exception:
+            pass  # Image illisible : signalée quand la miniature sera affichée
+        finally:
+            with self._lock:
+                self._prefetching.discard(key)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, data = self._entries.popitem(last=False)
+            self._total_bytes -= len(data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
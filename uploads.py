@@ -0,0 +1,93 @@
+"""Réception des fichiers uploadés : une seule copie sur disque, par blocs.
+
+Chaque fichier est écrit une fois dans un dossier temporaire, en calculant
+au passage sa taille et son empreinte SHA-256 (qui nomme son emplacement).
+Tri, aperçus et conversion travaillent ensuite sur cette copie (un chemin
+local, comme pour un dossier) sans recopier le contenu en mémoire. Les
+copies abandonnées sont supprimées après ``ttl`` secondes.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+
+DEFAULT_UPLOAD_DIR = os.path.join(tempfile.gettempdir(), "ogef_uploads")
+# Durée de conservation des copies (s), bien au-delà de celle d'une conversion
+DEFAULT_UPLOAD_TTL = 24 * 3600
+# Intervalle minimal entre deux purges des copies expirées (s)
+PURGE_INTERVAL = 3600
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class SpooledUpload:
+    """Fichier uploadé copié sur disque, avec ses métadonnées de réception"""
+    name: str
+    path: str
+    size: int
+
+
+class UploadSpool:
+    """Dossier des copies de fichiers uploadés, rangées par contenu.
+
+    Une copie est placée dans ``<dossier>/<empreinte>/<nom d'origine>`` :
+    le nom affiché pendant la conversion reste celui de l'utilisateur et un
+    même contenu envoyé deux fois n'occupe qu'un emplacement.
+    """
+
+    def __init__(self, directory=DEFAULT_UPLOAD_DIR, ttl=DEFAULT_UPLOAD_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._last_purge = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def ingest(self, uploaded):
+        """Copie un fichier uploadé par blocs et renvoie son :class:`SpooledUpload`"""
+        name = os.path.basename(uploaded.name)
+        digest = hashlib.sha256()
+        size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                uploaded.seek(0)
+                for chunk in iter(lambda: uploaded.read(_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+
+            folder = os.path.join(self.directory, digest.hexdigest()[:32])
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, name)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return SpooledUpload(name=name, path=path, size=size)
+
+    def purge_if_due(self):
+        """Purge les copies expirées, au plus une fois par PURGE_INTERVAL secondes"""
+        if time.time() - self._last_purge >= PURGE_INTERVAL:
+            self.purge()
+
+    def purge(self):
+        """Supprime les copies plus anciennes que ``ttl`` secondes"""
+        self._last_purge = time.time()
+        limit = time.time() - self.ttl
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                try:
+                    if entry.stat().st_mtime < limit:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+            try:
+                os.rmdir(folder.path)
+            except OSError:
+                pass  # Dossier encore utilisé